@@ -0,0 +1,96 @@
+""" Random playouts for many games at once, advanced in lockstep with NumPy array operations.
+
+Each game is kept as bitboards in a few small integer arrays: the 9 x 2 sub-board masks, the two big-board
+masks, the required board (9 when unconstrained) and the player to move. Every step plays one uniformly
+random legal move in every unfinished game, then drops the games that just ended.
+"""
+import random
+import numpy as np
+from p2_t3 import win_table, full_table, popcount_table, free_cells_table
+
+UNCONSTRAINED = 9
+
+_win = np.array(win_table, dtype=bool)
+_full = np.array(full_table, dtype=bool)
+_popcount = np.array(popcount_table, dtype=np.int64)
+
+# _nth_cell[mask, n] is the index of the n-th set bit of a 9-bit mask.
+_nth_cell = np.zeros((0x200, 9), dtype=np.int64)
+for _mask, _cells in enumerate(free_cells_table):
+    _nth_cell[_mask, :len(_cells)] = _cells
+
+_board_bits = np.left_shift(1, np.arange(9))
+
+
+def _winners(big):
+    """ Returns 1/2/0 for each game whose big board is decided and -1 for games still in progress. """
+    p1 = big[:, 0] & ~big[:, 1]
+    p2 = big[:, 1] & ~big[:, 0]
+    result = np.full(len(big), -1, dtype=np.int8)
+    result[_full[big[:, 0] | big[:, 1]]] = 0
+    result[_win[p2]] = 2
+    result[_win[p1]] = 1
+    return result
+
+
+def simulate(states, rng=None):
+    """ Plays every state out to the end with uniformly random moves.
+
+    Args:
+        states: A sequence of p2_t3.Board tuple states, e.g. one leaf replicated N times or N different leaves.
+        rng:    A numpy Generator. Defaults to one seeded from the random module, so random.seed() makes
+                batched playouts reproducible too.
+
+    Returns:    An int8 array with the winner of each game, 1 or 2, or 0 for a draw.
+
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+
+    boards = np.array([state[:18] for state in states], dtype=np.int64).reshape(-1, 9, 2)
+    big = np.array([state[18:20] for state in states], dtype=np.int64)
+    constraint = np.array([UNCONSTRAINED if state[20] is None else 3 * state[20] + state[21]
+                           for state in states], dtype=np.int64)
+    player = np.array([state[22] - 1 for state in states], dtype=np.int64)
+
+    results = _winners(big)
+    games = np.flatnonzero(results == -1)
+    boards, big, constraint, player = boards[games], big[games], constraint[games], player[games]
+
+    while len(games):
+        rows = np.arange(len(games))
+
+        # Count the free cells of every playable board.
+        free = ~(boards[:, :, 0] | boards[:, :, 1]) & 0x1ff
+        finished = (big[:, 0] | big[:, 1])[:, None] & _board_bits
+        allowed = (constraint[:, None] == UNCONSTRAINED) | (constraint[:, None] == np.arange(9))
+        counts = np.where(allowed & (finished == 0), _popcount[free], 0)
+
+        # Pick the n-th legal move of each game uniformly, then locate its board and cell.
+        cumulative = counts.cumsum(axis=1)
+        n = rng.integers(cumulative[:, -1])
+        k = (cumulative <= n[:, None]).sum(axis=1)
+        cell = _nth_cell[free[rows, k], n - (cumulative[rows, k] - counts[rows, k])]
+
+        boards[rows, k, player] |= 1 << cell
+        mine = boards[rows, k, player]
+        won = _win[mine]
+        tied = ~won & _full[boards[rows, k, 0] | boards[rows, k, 1]]
+
+        bit = 1 << k
+        big[rows, player] |= np.where(won, bit, 0)
+        big[:, 0] |= np.where(tied, bit, 0)
+        big[:, 1] |= np.where(tied, bit, 0)
+
+        constraint = np.where((big[:, 0] | big[:, 1]) >> cell & 1, UNCONSTRAINED, cell)
+        player ^= 1
+
+        ended = _winners(big)
+        done = ended != -1
+        if done.any():
+            results[games[done]] = ended[done]
+            keep = ~done
+            games, boards, big = games[keep], boards[keep], big[keep]
+            constraint, player = constraint[keep], player[keep]
+
+    return results
@@ -0,0 +1,210 @@
+""" Benchmark suite for the game engine and the bots, run on a fixed corpus of seeded positions.
+
+Micro benchmarks time single Board operations (next_state, legal_actions, is_ended, win_values) and full
+random playouts over every position of a phase; macro benchmarks time each bot's think() at a fixed budget
+and report the MCTS iterations/sec the searches actually ran (SearchStats.iterations, since a search may stop
+before its budget). Every result is the best of --repeat runs, in operations per second.
+
+Results can be written as JSON and compared against a stored baseline; any benchmark slower than the
+baseline by more than --tolerance is reported as a regression and makes the script exit with status 1.
+
+Usage:
+    python benchmark.py [--output FILE] [--baseline FILE] [--tolerance 0.1] [--repeat 3] [--only PATTERN]
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+from timeit import default_timer as time
+import p2_t3
+import p2_t3_packed
+import mcts_vanilla
+import mcts_modified
+import random_bot
+import rollout_bot
+
+board = p2_t3.Board()
+packed_board = p2_t3_packed.PackedBoard()
+
+# Phase -> (minimum, maximum) number of random moves from the start.
+phases = dict(
+    opening=(0, 10),
+    midgame=(20, 35),
+    endgame=(45, 60),
+)
+positions_per_phase = 20
+corpus_seed = 2024
+
+# Bot -> (think function, module to configure or None, board); MCTS bots search mcts_budget iterations per move.
+# mcts_vanilla_packed runs mcts_vanilla on PackedBoard states, to keep PackedBoard a drop-in board for it.
+bots = dict(
+    random_bot=(random_bot.think, None, board),
+    rollout_bot=(rollout_bot.think, None, board),
+    mcts_vanilla=(mcts_vanilla.think, mcts_vanilla, board),
+    mcts_vanilla_packed=(mcts_vanilla.think, mcts_vanilla, packed_board),
+    mcts_modified=(mcts_modified.think, mcts_modified, board),
+)
+mcts_budget = 200
+
+
+def make_corpus(seed=corpus_seed, count=positions_per_phase):
+    """ Returns {phase: [state, ...]}, the same positions for the same seed on every machine.
+
+    Positions are reached by random play and re-drawn when the game ends before the phase's move count.
+    """
+    rng = random.Random(seed)
+    corpus = {}
+    for phase, (low, high) in phases.items():
+        states = []
+        while len(states) < count:
+            state = board.starting_state()
+            for _ in range(rng.randint(low, high)):
+                if board.is_ended(state):
+                    break
+                state = board.next_state(state, board.random_legal_action(state, rng))
+            if not board.is_ended(state):
+                states.append(state)
+        corpus[phase] = states
+    return corpus
+
+
+def measure(run, operations, repeat):
+    """ Times repeat calls to run() and returns the best rate in operations per second, with the rates of the
+    counts run() returned on that fastest call (a dict of name -> count, or None) as a dict of name -> rate.
+    """
+    best = float('inf')
+    best_counts = None
+    for _ in range(repeat):
+        start = time()
+        counts = run()
+        elapsed = time() - start
+        if elapsed < best:
+            best, best_counts = elapsed, counts
+    return operations / best, dict((key, count / best) for key, count in (best_counts or {}).items())
+
+
+def engine_benchmarks(corpus, loops=50):
+    """ Yields (name, run, operations, counted) for the Board operations on each phase. """
+    for phase, states in corpus.items():
+        rng = random.Random(corpus_seed)
+        moves = [(state, board.random_legal_action(state, rng)) for state in states]
+        operations = loops * len(states)
+
+        def next_state(moves=moves):
+            for _ in range(loops):
+                for state, action in moves:
+                    board.next_state(state, action)
+
+        def per_state(operation, states=states):
+            def run():
+                for _ in range(loops):
+                    for state in states:
+                        operation(state)
+            return run
+
+        def random_playout(states=states):
+            random.seed(corpus_seed)
+            for state in states:
+                board.random_playout(state)
+
+        yield 'next_state/' + phase, next_state, operations, ()
+        yield 'legal_actions/' + phase, per_state(board.legal_actions), operations, ()
+        yield 'is_ended/' + phase, per_state(board.is_ended), operations, ()
+        yield 'win_values/' + phase, per_state(board.win_values), operations, ()
+        yield 'random_playout/' + phase, random_playout, len(states), ()
+
+
+def bot_benchmarks(corpus, positions=5):
+    """ Yields (name, run, operations, counted) for each bot's think() on the first positions of each phase.
+
+    Operations are moves; for the MCTS bots, run() also returns the iterations its searches ran, summed from
+    their SearchStats, and counted names the iterations/sec result, so both come from the same run.
+    """
+    for name, (think, module, bot_board) in bots.items():
+        for phase, states in corpus.items():
+            states = states[:positions]
+            if bot_board is not board:
+                states = [bot_board.from_tuple(state) for state in states]
+            counted = () if module is None else ('iterations/%s/%s' % (name, phase),)
+
+            def run(think=think, module=module, bot_board=bot_board, states=states, counted=counted):
+                if module is None:
+                    random.seed(corpus_seed)
+                    with contextlib.redirect_stdout(io.StringIO()):     # rollout_bot prints every move
+                        for state in states:
+                            think(bot_board, state)
+                    return None
+
+                saved = module.num_nodes, module.reuse_tree
+                module.num_nodes, module.reuse_tree = mcts_budget, False
+                try:
+                    random.seed(corpus_seed)
+                    iterations = 0
+                    for state in states:
+                        iterations += think(bot_board, state, return_stats=True)[1].iterations
+                finally:
+                    module.num_nodes, module.reuse_tree = saved
+                return {counted[0]: iterations}
+
+            yield 'think/%s/%s' % (name, phase), run, len(states), counted
+
+
+def compare(results, baseline, tolerance):
+    """ Prints each result against the baseline and returns the names that got slower than tolerance allows. """
+    regressions = []
+    for name, rate in results.items():
+        if name not in baseline:
+            print("%-36s %12.0f/s   (no baseline)" % (name, rate))
+            continue
+        ratio = rate / baseline[name]
+        flag = ''
+        if ratio < 1 - tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print("%-36s %12.0f/s   %5.2fx baseline%s" % (name, rate, ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the game engine and the bots.")
+    parser.add_argument('--output', metavar='FILE', help="write the results as JSON to FILE")
+    parser.add_argument('--baseline', metavar='FILE', help="compare against results previously written by --output")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="fraction slower than the baseline that counts as a regression (default 0.1)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark, the best one counts")
+    parser.add_argument('--only', metavar='PATTERN', help="only run benchmarks whose name contains PATTERN")
+    args = parser.parse_args()
+
+    corpus = make_corpus()
+    results = {}
+    for benchmarks in (engine_benchmarks(corpus), bot_benchmarks(corpus)):
+        for name, run, operations, counted in benchmarks:
+            if args.only and not any(args.only in key for key in (name,) + counted):
+                continue
+            results[name], rates = measure(run, operations, args.repeat)
+            results.update(rates)
+            if not args.baseline:
+                for key in (name,) + counted:
+                    print("%-36s %12.0f/s" % (key, results[key]))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'corpus_seed': corpus_seed,
+                'mcts_budget': mcts_budget,
+                'results': results,
+            }, f, indent=1, sort_keys=True)
+
+    if regressions:
+        print("%d regression(s): %s" % (len(regressions), ', '.join(regressions)))
+        sys.exit(1)
@@ -0,0 +1,117 @@
+""" Elo estimates with confidence intervals, and a sequential probability ratio test (SPRT) for matches.
+
+Scores count a win as 1, a draw as 1/2 and a loss as 0, and Elo differences use the logistic model
+score = 1 / (1 + 10 ** (-elo / 400)).
+
+The SPRT weighs H0: "the Elo difference is elo0" against H1: "it is elo1" after every game, and stops as
+soon as the log-likelihood ratio (LLR) leaves the interval set by the error rates alpha (accepting H1 when
+H0 holds) and beta (accepting H0 when H1 holds). It uses the normal approximation of the generalized SPRT
+on the trinomial win/draw/loss outcome, LLR = N (s1 - s0) (2 mean - s0 - s1) / (2 variance).
+"""
+from math import log, log10, sqrt
+from statistics import NormalDist
+
+
+def elo_to_score(elo: float):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score: float):
+    """ Returns the Elo difference giving score, clamped to +-inf at 0 and 1. """
+    if score <= 0:
+        return float('-inf')
+    if score >= 1:
+        return float('inf')
+    return -400 * log10(1 / score - 1)
+
+
+def score_stats(wins: int, losses: int, draws: int):
+    """ Returns the number of games, the mean score and the per-game score variance. """
+    games = wins + losses + draws
+    if games == 0:
+        return 0, 0.5, 0.
+    mean = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - mean) ** 2 + losses * mean ** 2 + draws * (0.5 - mean) ** 2) / games
+    return games, mean, variance
+
+
+def _test_variance(wins, losses, draws):
+    """ The per-game score variance, kept positive when every game so far had the same result by counting
+    half a win and half a loss more. """
+    variance = score_stats(wins, losses, draws)[2]
+    if variance == 0:
+        variance = score_stats(wins + 0.5, losses + 0.5, draws)[2]
+    return variance
+
+
+def elo_interval(wins: int, losses: int, draws: int, confidence: float = 0.95):
+    """ Estimates the Elo difference from a match result.
+
+    Args:
+        wins:       Games won by the side the estimate is for.
+        losses:     Games it lost.
+        draws:      Games drawn.
+        confidence: The probability the interval should cover.
+
+    Returns:
+        elo: The Elo difference matching the mean score.
+        low: The lower bound of the confidence interval.
+        high: The upper bound of the confidence interval.
+
+    """
+    games, mean, _ = score_stats(wins, losses, draws)
+    if games == 0:
+        return 0., float('-inf'), float('inf')
+    variance = _test_variance(wins, losses, draws)
+    margin = NormalDist().inv_cdf(0.5 + confidence / 2) * sqrt(variance / games)
+    return score_to_elo(mean), score_to_elo(mean - margin), score_to_elo(mean + margin)
+
+
+def likelihood_of_superiority(wins: int, losses: int):
+    """ Returns the probability that the side with wins is the stronger one (draws carry no information). """
+    if wins + losses == 0:
+        return 0.5
+    return NormalDist().cdf((wins - losses) / sqrt(wins + losses))
+
+
+class SPRT(object):
+    """ Sequential test of H0: Elo difference = elo0 against H1: Elo difference = elo1 (elo1 > elo0). """
+
+    def __init__(self, elo0: float, elo1: float, alpha: float = 0.05, beta: float = 0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = log(beta / (1 - alpha))
+        self.upper = log((1 - beta) / alpha)
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+
+    def add(self, score: float):
+        """ Records one game scored 1, 0.5 or 0 for the tested side. """
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def llr(self):
+        games, mean, _ = score_stats(self.wins, self.losses, self.draws)
+        if games == 0:
+            return 0.
+        variance = _test_variance(self.wins, self.losses, self.draws)
+        s0, s1 = elo_to_score(self.elo0), elo_to_score(self.elo1)
+        return games * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+    def status(self):
+        """ Returns 'H1' or 'H0' once a hypothesis is accepted, None while the test should go on. """
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def __repr__(self):
+        return "SPRT elo0=%g elo1=%g: LLR %.2f in [%.2f, %.2f] after %d-%d-%d" % (
+            self.elo0, self.elo1, self.llr(), self.lower, self.upper, self.wins, self.losses, self.draws)
@@ -0,0 +1,169 @@
+""" Exact solver for the end of the game, used by the MCTS bots in place of rollouts near the end.
+
+solve() runs a negamax alpha-beta search over tuple states, with the values 1, 0 and -1 (win, draw, loss)
+for the player to move. Every position it finishes is kept in a memo table with the bound alpha-beta gave
+it, so positions reached again by another move order, another leaf or a later move cost a single lookup.
+Moves that win their sub-board are tried first, since they give most of the cutoffs.
+
+How far the search has to look depends on the empty playable cells (free cells of undecided sub-boards):
+a dozen or so usually solve in a few thousand positions, while the search grows quickly past that. solve()
+gives up after node_limit positions, so a caller can set its threshold optimistically.
+"""
+from p2_t3 import win_table, full_table, popcount_table, completion_table, cell_actions_table
+
+node_limit = 20000          # positions one solve() may search before giving up
+memo_capacity = 1 << 20     # the memo table is emptied when it grows past this many positions
+
+EXACT, LOWER, UPPER = 0, 1, 2   # the stored value is exact, a lower bound or an upper bound
+
+_memo = {}                  # state -> (value, bound) for the player to move
+
+
+class SolverLimit(Exception):
+    """ Raised inside the search once it has visited node_limit positions. """
+
+
+def playable_cells(state):
+    """ Returns the number of free cells in undecided sub-boards, i.e. the moves left in the longest game. """
+    finished = state[18] | state[19]
+    count = 0
+    for k in range(9):
+        if not finished >> k & 1:
+            count += popcount_table[~(state[2 * k] | state[2 * k + 1]) & 0x1ff]
+    return count
+
+
+def clear():
+    """ Empties the memo table. """
+    _memo.clear()
+
+
+def solve(state, limit: int|None = None):
+    """ Finds the result of a position under perfect play.
+
+    Args:
+        state:  A p2_t3.Board tuple state (or anything indexable like one, such as a MutableBoard).
+        limit:  The most positions to search, node_limit by default.
+
+    Returns:
+        The winner under perfect play, 1 or 2, or 0 for a draw; None if the search ran out of positions.
+
+    """
+    if not isinstance(state, tuple):
+        state = tuple(state[i] for i in range(23))
+    player = state[22]
+    if _ended(state):
+        return _winner(state)
+    if len(_memo) > memo_capacity:
+        _memo.clear()
+
+    search = _Search(node_limit if limit is None else limit)
+    try:
+        value = search.negamax(state, -1, 1)
+    except SolverLimit:
+        return None
+    return player if value == 1 else 3 - player if value == -1 else 0
+
+
+def _ended(state):
+    return (win_table[state[18] & ~state[19]] or
+            win_table[state[19] & ~state[18]] or
+            full_table[state[18] | state[19]])
+
+
+def _winner(state):
+    if win_table[state[18] & ~state[19]]:
+        return 1
+    if win_table[state[19] & ~state[18]]:
+        return 2
+    return 0
+
+
+def _ordered_actions(state):
+    """ The legal actions of a state that is not over, the ones winning their sub-board first. """
+    finished = state[18] | state[19]
+    player_index = state[22] - 1
+    boards = range(9) if state[20] is None else (3 * state[20] + state[21],)
+
+    wins = []
+    others = []
+    for k in boards:
+        if finished >> k & 1:
+            continue
+        own = state[2 * k + player_index]
+        free = ~(own | state[2 * k + 1 - player_index]) & 0x1ff
+        winning = completion_table[own] & free
+        wins.extend(cell_actions_table[k][winning])
+        others.extend(cell_actions_table[k][free & ~winning])
+    return wins + others
+
+
+def _play(state, action):
+    """ Same as p2_t3.Board.next_state. """
+    R, C, r, c = action
+    k = 3 * R + C
+    cell = 3 * r + c
+    player_index = state[22] - 1
+
+    state = list(state)
+    state[22] = 2 - player_index
+    state[2 * k + player_index] |= 1 << cell
+    if win_table[state[2 * k + player_index]]:
+        state[18 + player_index] |= 1 << k
+    elif full_table[state[2 * k] | state[2 * k + 1]]:
+        state[18] |= 1 << k
+        state[19] |= 1 << k
+
+    if (state[18] | state[19]) >> cell & 1:
+        state[20], state[21] = None, None
+    else:
+        state[20], state[21] = r, c
+    return tuple(state)
+
+
+class _Search(object):
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.nodes = 0
+
+    def negamax(self, state, alpha: int, beta: int):
+        """ Returns the value of state (not over) for the player to move, exact when it lies in (alpha, beta). """
+        entry = _memo.get(state)
+        if entry is not None:
+            value, bound = entry
+            if bound == EXACT:
+                return value
+            if bound == LOWER and value >= beta:
+                return value
+            if bound == UPPER and value <= alpha:
+                return value
+
+        self.nodes += 1
+        if self.nodes > self.limit:
+            raise SolverLimit()
+
+        player = state[22]
+        original_alpha = alpha
+        best = -2
+        for action in _ordered_actions(state):
+            child = _play(state, action)
+            if _ended(child):
+                # The mover can only win or draw the game with their own move
+                winner = _winner(child)
+                value = 1 if winner == player else 0 if winner == 0 else -1
+            else:
+                value = -self.negamax(child, -beta, -alpha)
+            if value > best:
+                best = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if best <= original_alpha:
+            _memo[state] = (best, UPPER)
+        elif best >= beta:
+            _memo[state] = (best, LOWER)
+        else:
+            _memo[state] = (best, EXACT)
+        return best
@@ -1,11 +1,40 @@
 
-from mcts_node import MCTSNode
-from p2_t3 import Board, positions
+import sys
+import parallel_mcts
+import rollout_tables
+import endgame_solver
+import opening_book
+import stats_cache
+from mcts_node import MCTSNode, find_subtree, node_depth, count_nodes, propagate_proof
+from search_stats import SearchStats
+from transposition import TranspositionTable, dag_iteration
+from p2_t3 import Board, positions, threat_boards
+from p2_t3_mutable import MutableBoard
 from random import choice
 from math import sqrt, log
+from timeit import default_timer as time
 
 num_nodes = 1000
 explore_faction = 2.
+move_time = None            # seconds per move; when set, think() searches until it runs out instead of for num_nodes
+max_tree_nodes = None       # when set, think() also stops once the tree holds this many nodes
+clock_check_interval = 16   # iterations between clock reads when searching against a time budget
+use_rollout_tables = True   # play the heuristic rollout moves from precomputed tables (same moves, see rollout_tables)
+use_mutable_board = False   # search on a single MutableBoard with push/pop instead of tuple states
+use_transpositions = False  # share nodes between move orders through a Zobrist-keyed transposition table
+transposition_capacity = 200000
+reuse_tree = True           # keep the tree between moves and continue from the subtree of the actual position
+book_path = None            # an opening book file (opening_book.py); think() plays its move without searching
+stats_cache_path = None     # an SQLite file (stats_cache.py) new nodes start from and each search adds its
+                            # statistics to; not used with use_transpositions
+collapse_symmetric_moves = True    # a new root keeps one of each set of moves its symmetries make equivalent
+solver_threshold = 12       # below this many empty playable cells, solve new leaves exactly (endgame_solver) instead
+                            # of rolling out and prove results up the tree; 0 disables. Not used with
+                            # use_transpositions
+use_rave = False            # blend AMAF statistics of the rollout moves into ucb (RAVE); tuple-state search only
+rave_equivalence = 300      # RAVE schedule: AMAF weight sqrt(k / (3 * visits + k)), k = rave_equivalence
+profile = False             # record per-phase times, rollout lengths and the tree size in the SearchStats
+num_workers = 1             # when > 1, search this many independent trees in a process pool and merge the roots
 
 def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
     """ Traverses the tree until the end criterion are met.
@@ -23,34 +52,32 @@ def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
         state: The state associated with that node
 
     """
-    # Check if the current node is a terminal node
-    if(board.is_ended(state)):
-        return node, state
-    
-    # Check if the current node is a leaf node
-    if(len(node.untried_actions) != len(node.child_nodes)):
-        return node, state
-    
-    # Find the child with the highest UCT score
-    max_node = None
-    max_state = None
-    max_score = 0
-    for action, child in node.child_nodes.items():
-        # Calculate child UCT score
-        UCT_score = ucb(child, board.current_player(state) != bot_identity)
-
-        # Set the child if it has a higher UCT score
-        if UCT_score > max_score:
-            max_node = child
-            max_state = board.next_state(state, action)
-            max_score = UCT_score
-    
-    # If the game ends at the child, current_player breaks
-    if(max_state is None):
-        return node, state
-    
-    # Take the node and action and recursively continue
-    return traverse_nodes(max_node, board, max_state, board.current_player(max_state))
+    while not board.is_ended(state) and len(node.untried_actions) == len(node.child_nodes) and node.proven is None:
+        # Find the child with the highest UCT score; only the chosen child's state gets built
+        max_node = None
+        max_action = None
+        max_score = 0
+        loser = 3 - board.current_player(state)     # children proven won by this player are never chosen
+        is_opponent = loser == bot_identity
+        log_visits = log(node.visits)
+        for action, child in node.child_nodes.items():
+            if child.proven == loser:
+                continue
+            UCT_score = ucb(child, is_opponent, log_visits)
+            if UCT_score > max_score:
+                max_node = child
+                max_action = action
+                max_score = UCT_score
+
+        if max_node is None:
+            break
+
+        # Continue from the chosen child, with the same perspective rule the recursive version had
+        node = max_node
+        state = board.next_state(state, max_action)
+        bot_identity = board.current_player(state)
+
+    return node, state
 
 def expand_leaf(node: MCTSNode, board: Board, state):
     """ Adds a new leaf to the tree by creating a new child node for the given node (if it is non-terminal).
@@ -65,8 +92,8 @@ def expand_leaf(node: MCTSNode, board: Board, state):
         state: The state associated with that node
 
     """
-    # Check if current node is a terminal node
-    if(board.is_ended(state)):
+    # Check if current node is a terminal node, or proven (its result needs no more search)
+    if(board.is_ended(state) or node.proven is not None):
         return node, state
     
     # Define the action that is to be taken from parent -> child
@@ -81,12 +108,95 @@ def expand_leaf(node: MCTSNode, board: Board, state):
 
     return child, child_state
 
-def rollout(board: Board, state, bot_identity):
-    
+def traverse_nodes_in_place(node: MCTSNode, mboard: MutableBoard, bot_identity: int):
+    """ Same selection as traverse_nodes, but plays the chosen actions onto mboard instead of building states.
+
+    Args:
+        node:           A tree node from which the search is traversing.
+        mboard:         The mutable board, positioned at node's state.
+        bot_identity:   The bot's identity, either 1 or 2
+
+    Returns:
+        node: A node from which the next stage of the search can proceed, with mboard positioned at its state.
+
+    """
+    while not mboard.is_ended() and len(node.untried_actions) == len(node.child_nodes) and node.proven is None:
+        # Find the child with the highest UCT score
+        max_node = None
+        max_action = None
+        max_score = 0
+        loser = 3 - mboard.current_player()
+        is_opponent = loser == bot_identity
+        log_visits = log(node.visits)
+        for action, child in node.child_nodes.items():
+            if child.proven == loser:
+                continue
+            UCT_score = ucb(child, is_opponent, log_visits)
+            if UCT_score > max_score:
+                max_node = child
+                max_action = action
+                max_score = UCT_score
+
+        if max_node is None:
+            break
+
+        mboard.push(max_action)
+        node = max_node
+        bot_identity = mboard.current_player()
+
+    return node
+
+def expand_leaf_in_place(node: MCTSNode, mboard: MutableBoard):
+    """ Same as expand_leaf, but plays the new child's action onto mboard.
+
+    Args:
+        node:   The node for which a child will be added.
+        mboard: The mutable board, positioned at node's state.
+
+    Returns:
+        node: The added child node, with mboard positioned at its state.
+
+    """
+    if mboard.is_ended() or node.proven is not None:
+        return node
+
+    action_taken = choice(node.untried_actions)
+    mboard.push(action_taken)
+    child = MCTSNode(parent=node, parent_action=action_taken, action_list=mboard.legal_actions())
+    node.child_nodes[action_taken] = child
+
+    return child
+
+def rollout(board: Board, state, bot_identity, played: list|None = None):
+    """ Plays the game out with this bot's heuristic moves against random ones.
+
+    Args:
+        board:          The game setup.
+        state:          The state of the game.
+        bot_identity:   The bot's identity, either 1 or 2
+        played:         A list to append the moves of the playout to, if given.
+
+    Returns:
+        The terminal game state
+
+    """
     curState = state
-    subBoard = None
-    grid = {}       # dict of subboard, storing owners
-    valueGrid = {}  # dict of subboard, storing values
+
+    if use_rollout_tables:
+        # Same moves as below, looked up instead of computed
+        rollout_tables.load(heuristic_values)
+        turn = True
+        while not board.is_ended(curState):
+            if turn:
+                action = rollout_tables.rollout_action(curState, bot_identity)
+            else:
+                action = board.random_legal_action(curState)
+            if played is not None:
+                played.append(action)
+            curState = board.next_state(curState, action)
+            turn = not turn
+        return curState
+
     turn = True     # is the simulation on this bot's turn
     actions = None  # legal actions
 
@@ -95,208 +205,251 @@ def rollout(board: Board, state, bot_identity):
         if turn :                                               # if it is this bot's turn
             actions = board.legal_actions(curState)                 # populate all actions
 
-            if len(board.legal_actions(curState)) > 9 :            # if the board is empty
+            if len(actions) > 9 :            # if the board is empty
                 curState = board.next_state(curState, (1, 1, 1, 1))     # play the center, we are assuming this is the most valuable position
+                if played is not None:
+                    played.append((1, 1, 1, 1))
 
             else :                                                  # in all other cases
-                # find the subboard we are in and populate it, also populate valueGrid
-                subBoard = (actions[0][0], actions[0][1])               # assume the first legal action's 1st element is the column and 2nd element is the row, MIGHT BE REVERSED
-                for x in range(3) :
-                    for y in range(3) :
-                        valueGrid[(x, y)] = 0
-                        grid[(x, y)] = get_cell_owner(curState, subBoard[0], subBoard[1], x, y)
-                        if grid[(x, y)] is not 0 :
-                            valueGrid[(x, y)] = -1000
-
-                # assign "basic" values to valueGrid, see function description
-                valueGrid[(1, 1)] += 3
-                for x in range(3) :
-                    for y in range(3) :
-                        if (x is 0 or x is 2) and (y is 0 or y is 2) :  # corner
-                            valueGrid[(x, y)] += 1
-                        if grid[(x, y)] is not 0 and grid[(x, y)] is not bot_identity : # a grid space is occupied by the opponent
-                            for i in range(-1, 2) :
-                                for j in range(-1, 2) :
-                                    if (x + i <= 2) and (x + i >= 0) and (y + j <= 2) and (y + j >= 0) and (abs(x + i) is not abs(y + j)) :     # if the cell is in bounds and is not a diagonal or the space itself
-                                        valueGrid[(x + i, y + j)] += 4
-                
-                # check to see if there is any row or column that has exactly 1 empty squares and 2 squares owned by a player
-                # =================== im giving this a distinct break for readability ====================
-                for i in range(3) :
-                    zeroesR = 0     # zeroes in row
-                    zeroesC = 0     # zeroes in column
-                    for j in range(3) :     # count zeroes in row and column i
-                        if grid[(i, j)] is 0 :
-                            zeroesR += 1
-                        if grid[(j, i)] is 0 :
-                            zeroesC += 1
-                    ones = 0
-                    twos = 0
-                    if zeroesR is 1 :       # if there is only 1 empty space in row i
-                        for j in range(3) : # count X's and O's in row i
-                            if grid[(i, j)] is 1 :
-                                ones += 1
-                            if grid[(i, j)] is 2 :
-                                twos += 1
-                        if ones is 2 or twos is 2 : # if there is 2 X's or O's in row i
-                            for j in range(3) :
-                                if grid[(i, j)] is 0 :  # find the empty space in row i
-                                    valueGrid[(i, j)] += 7  # and increase its value accordingly
-                    ones = 0
-                    twos = 0
-                    if zeroesC is 1 :       # if there is only 1 empty space in column i (this is the exact same as the row chunk)
-                        for j in range(3) :
-                            if grid[(j, i)] is 1 :
-                                ones += 1
-                            if grid[(j, i)] is 2 :
-                                twos += 1
-                        if ones is 2 or twos is 2 :
-                            for j in range(3) :
-                                if grid[(j, i)] is 0 :
-                                    valueGrid[(i, j)] += 7
-
-                    # diagonals are hardcoded, sorry
-                    zeroes = 0
-                    ones = 0
-                    twos = 0
-                    for i in range(3) : # top left to bottom right is easy
-                        match grid[(i, i)] :
-                            case 0:
-                                zeroes += 1
-                            case 1:
-                                ones += 1
-                            case 2:
-                                twos += 1
-                            case _:
-                                pass        # should never run, will break everything
-                    if zeroes is 1 and (ones is 2 or twos is 2) :
-                        for i in range(3) :
-                            if grid[(i, i)] is 0 :
-                                valueGrid[(i, i)] += 7
-                    zeroes = 0
-                    ones = 0
-                    twos = 0
-                    for i in range(3) :
-                        for j in range(2, -1) :
-                            match grid[(i, j)] :
-                                case 0:
-                                    zeroes += 1
-                                case 1:
-                                    ones += 1
-                                case 2:
-                                    twos += 1
-                                case _:
-                                    pass        # should never run, will break everything
-                    if zeroes is 1 and (ones is 2 or twos is 2) :
-                        for i in range(3) :
-                            for j in range(2, -1) :
-                                if grid[(i, j)] is 0 :
-                                    valueGrid[(i, j)] += 7
-                # =========================================================================================
-                # check subboard of each square, using a helper funciton to make this section not the most atrocious thing ever
-                for a in range(3) :
-                    for b in range(3) :
-                        if grid[(a, b)] is 0 :
-                            if confirm_sub_board(a, b, bot_identity, curState):
-                                valueGrid[(a, b)] -= 10
-                
-                # find the grid spot with the best value
-                x = 0
-                y = 0
-                value = -1000
-                for i in range(3) :
-                    for j in range(3) :
-                        if valueGrid[(i, j)] > value :
-                            x = i
-                            y = j
-                            value = valueGrid[(i, j)]
-                # perform the action with the highest value
-                intendedAction = (subBoard[0], subBoard[1], x, y)
+                intendedAction = heuristic_action(curState, actions, bot_identity)
                 if board.is_legal(curState, intendedAction) :   # CHECK TO MAKE SURE IT'S LEGAL
                     curState = board.next_state(curState, intendedAction)
+                    if played is not None:
+                        played.append(intendedAction)
                 else :
                     print("Something is very wrong :(")
 
         else :  # it is not this bot's turn
-            curState = board.next_state(curState, choice(board.legal_actions(curState))) # assume the other player plays randomly
+            action = board.random_legal_action(curState)    # assume the other player plays randomly
+            if played is not None:
+                played.append(action)
+            curState = board.next_state(curState, action)
 
         # reset values, switch perspectives
         actions = None
-        subBoard = None
-        grid = {}
-        valueGrid = {}
         turn = not turn
 
     return(curState)
 
-def confirm_sub_board(boardx, boardy, bot_identity, state) :
+def rollout_in_place(mboard: MutableBoard, bot_identity):
+    """ Same playout as rollout, but played onto mboard with push().
 
-    bad = 0
-    grid = {}
+    Args:
+        mboard:         The mutable board to play out. The caller is responsible for undoing the moves.
+        bot_identity:   The bot's identity, either 1 or 2
 
-    for a in range(3):
-        for b in range(3):
-            grid[(a, b)] = get_cell_owner(state, boardx, boardy, a, b)
+    Returns:
+        The winner of the playout, 1 or 2, or 0 for a draw.
 
-    match bot_identity:
-        case 1:
-            bad = 2
-        case 2:
-            bad = 1
+    """
+    turn = True     # is the simulation on this bot's turn
 
-    zeroesD1 = 0
-    badD1 = 0
-    zeroesD2 = 0
-    badD2 = 0
+    if use_rollout_tables:
+        rollout_tables.load(heuristic_values)
+        while not mboard.is_ended():
+            if turn:
+                mboard.push(rollout_tables.rollout_action(mboard, bot_identity))
+            else:
+                mboard.push(mboard.random_legal_action())
+            turn = not turn
+        return mboard.winner()
+
+    while not mboard.is_ended():
+        if turn :
+            actions = mboard.legal_actions()
+            if len(actions) > 9 :
+                mboard.push((1, 1, 1, 1))
+            else :
+                intendedAction = heuristic_action(mboard, actions, bot_identity)
+                if mboard.is_legal(intendedAction) :
+                    mboard.push(intendedAction)
+                else :
+                    print("Something is very wrong :(")
+        else :
+            mboard.push(mboard.random_legal_action())
+        turn = not turn
+
+    return mboard.winner()
+
+def heuristic_action(curState, actions, bot_identity):
+    """ Picks this bot's rollout move inside the sub-board of the first legal action.
+
+    Args:
+        curState:       The state of the game, either a p2_t3.Board tuple or a MutableBoard.
+        actions:        The legal actions in curState.
+        bot_identity:   The bot's identity, either 1 or 2
+
+    Returns:
+        The action with the highest heuristic value.
+
+    """
+    # find the subboard we are in
+    subBoard = (actions[0][0], actions[0][1])               # assume the first legal action's 1st element is the column and 2nd element is the row, MIGHT BE REVERSED
+    grid, valueGrid = heuristic_values(curState, subBoard, bot_identity)
+
+    # =========================================================================================
+    # avoid sending the opponent to a subboard it can win right away
+    danger = dangerous_boards(curState, bot_identity)
+    for a in range(3) :
+        for b in range(3) :
+            if grid[(a, b)] is 0 and danger & positions[(a, b)] :
+                valueGrid[(a, b)] -= 10
+                
+    # find the grid spot with the best value
+    x = 0
+    y = 0
+    value = -1000
+    for i in range(3) :
+        for j in range(3) :
+            if valueGrid[(i, j)] > value :
+                x = i
+                y = j
+                value = valueGrid[(i, j)]
+    # perform the action with the highest value
+    return (subBoard[0], subBoard[1], x, y)
+
+def heuristic_values(curState, subBoard, bot_identity):
+    """ Scores the cells of one sub-board for heuristic_action, before the penalty for sending the opponent to
+    a sub-board it can win. The scores depend only on that sub-board's cells and bot_identity.
+
+    Args:
+        curState:       The state of the game, either a p2_t3.Board tuple or a MutableBoard.
+        subBoard:       The (R, C) of the sub-board to play in.
+        bot_identity:   The bot's identity, either 1 or 2
+
+    Returns:
+        grid: (r, c) -> owner of the cell, 0, 1 or 2.
+        valueGrid: (r, c) -> heuristic value of playing the cell.
+
+    """
+    grid = {}       # dict of subboard, storing owners
+    valueGrid = {}  # dict of subboard, storing values
+    board_index = 3 * subBoard[0] + subBoard[1]
+    p1_bitmask = curState[2 * board_index]
+    p2_bitmask = curState[2 * board_index + 1]
+
+    # populate the subboard, also populate valueGrid
+    for x in range(3) :
+        for y in range(3) :
+            valueGrid[(x, y)] = 0
+            grid[(x, y)] = 1 if p1_bitmask & positions[(x, y)] else 2 if p2_bitmask & positions[(x, y)] else 0
+            if grid[(x, y)] is not 0 :
+                valueGrid[(x, y)] = -1000
+
+    # assign "basic" values to valueGrid, see function description
+    valueGrid[(1, 1)] += 3
+    for x in range(3) :
+        for y in range(3) :
+            if (x is 0 or x is 2) and (y is 0 or y is 2) :  # corner
+                valueGrid[(x, y)] += 1
+            if grid[(x, y)] is not 0 and grid[(x, y)] is not bot_identity : # a grid space is occupied by the opponent
+                for i in range(-1, 2) :
+                    for j in range(-1, 2) :
+                        if (x + i <= 2) and (x + i >= 0) and (y + j <= 2) and (y + j >= 0) and (abs(x + i) is not abs(y + j)) :     # if the cell is in bounds and is not a diagonal or the space itself
+                            valueGrid[(x + i, y + j)] += 4
+                
+    # check to see if there is any row or column that has exactly 1 empty squares and 2 squares owned by a player
+    # =================== im giving this a distinct break for readability ====================
     for i in range(3) :
         zeroesR = 0     # zeroes in row
         zeroesC = 0     # zeroes in column
-        badR = 0
-        badC = 0
-
-        for j in range(3) :     # count zeroes and bads in row and column i
+        for j in range(3) :     # count zeroes in row and column i
             if grid[(i, j)] is 0 :
                 zeroesR += 1
             if grid[(j, i)] is 0 :
                 zeroesC += 1
-            if grid[(i, j)] is bad :
-                badR += 1
-            if grid[(j, i)] is bad :
-                badC += 1
-
-        match grid[(i, i)]:     # count zeroes and bads in diag top left to bottom right
-            case 0:
-                zeroesD1 += 1
-            case bad:
-                badD1 += 1
-        
-        if (zeroesR is 1 and badR is 2) or (zeroesC is 1 and badC is 2):    # if a row or column has 1 empty and 2 bads
-            return(True)
-        
-    for i in range(3):
-        for j in range(2, -1):
-            match grid[(i, j)]:
+        ones = 0
+        twos = 0
+        if zeroesR is 1 :       # if there is only 1 empty space in row i
+            for j in range(3) : # count X's and O's in row i
+                if grid[(i, j)] is 1 :
+                    ones += 1
+                if grid[(i, j)] is 2 :
+                    twos += 1
+            if ones is 2 or twos is 2 : # if there is 2 X's or O's in row i
+                for j in range(3) :
+                    if grid[(i, j)] is 0 :  # find the empty space in row i
+                        valueGrid[(i, j)] += 7  # and increase its value accordingly
+        ones = 0
+        twos = 0
+        if zeroesC is 1 :       # if there is only 1 empty space in column i (this is the exact same as the row chunk)
+            for j in range(3) :
+                if grid[(j, i)] is 1 :
+                    ones += 1
+                if grid[(j, i)] is 2 :
+                    twos += 1
+            if ones is 2 or twos is 2 :
+                for j in range(3) :
+                    if grid[(j, i)] is 0 :
+                        valueGrid[(i, j)] += 7
+
+        # diagonals are hardcoded, sorry
+        zeroes = 0
+        ones = 0
+        twos = 0
+        for i in range(3) : # top left to bottom right is easy
+            match grid[(i, i)] :
                 case 0:
-                    zeroesD2 += 1
-                case bad:
-                    badD2 += 1
+                    zeroes += 1
+                case 1:
+                    ones += 1
+                case 2:
+                    twos += 1
+                case _:
+                    pass        # should never run, will break everything
+        if zeroes is 1 and (ones is 2 or twos is 2) :
+            for i in range(3) :
+                if grid[(i, i)] is 0 :
+                    valueGrid[(i, i)] += 7
+        zeroes = 0
+        ones = 0
+        twos = 0
+        for i in range(3) :
+            for j in range(2, -1) :
+                match grid[(i, j)] :
+                    case 0:
+                        zeroes += 1
+                    case 1:
+                        ones += 1
+                    case 2:
+                        twos += 1
+                    case _:
+                        pass        # should never run, will break everything
+        if zeroes is 1 and (ones is 2 or twos is 2) :
+            for i in range(3) :
+                for j in range(2, -1) :
+                    if grid[(i, j)] is 0 :
+                        valueGrid[(i, j)] += 7
+
+    return grid, valueGrid
+
+def dangerous_boards(state, bot_identity):
+    """ Returns the 9-bit mask of the sub-boards (bit 3 * R + C) this bot should not send the opponent to:
+    the undecided ones where the opponent can complete a line in one move.
+    """
+    return threat_boards(state, 3 - bot_identity)
 
-    if (zeroesD1 is 1 and badD1 is 2) or (zeroesD2 is 1 and badD2 is 2):    # if a diagonal has 1 empty and 2 bads
-        return(True)
-    
-    return(False)   # there is no move an opponent will win currently from this board
-
-def get_cell_owner(state, board_r, board_c, pos_r, pos_c):
-    board_index = 3 * board_r + board_c
-    p1_bitmask = state[2*board_index]
-    p2_bitmask = state[2*board_index+1]
-    is_p1 = (p1_bitmask & positions[(pos_r, pos_c)]) > 0
-    is_p2 = (p2_bitmask & positions[(pos_r, pos_c)]) > 0
-    if is_p1:
-        return 1
-    if is_p2:
-        return 2
-    return 0
+def prove_leaf(node: MCTSNode, board: Board, state):
+    """ Solves a leaf whose game is over or has fewer than solver_threshold empty playable cells left with
+    endgame_solver, and proves the ancestors its result decides.
+
+    Args:
+        node:   The leaf reached by this iteration.
+        board:  The game setup.
+        state:  The state associated with node, a tuple state, a PackedBoard int state or a MutableBoard.
+
+    Returns:
+        The winner the leaf is proven for (1, 2 or 0 for a draw), or None if it stays unproven.
+
+    """
+    if node.proven is None:
+        # The solver reads tuple states (or anything indexable like one)
+        solver_state = board.to_tuple(state) if isinstance(state, int) else state
+        if board.is_ended(state) or endgame_solver.playable_cells(solver_state) < solver_threshold:
+            node.proven = endgame_solver.solve(solver_state)
+            if node.proven is not None:
+                propagate_proof(node, board.previous_player(state))
+    return node.proven
 
 def backpropagate(node: MCTSNode|None, won: bool):
     """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
@@ -306,58 +459,100 @@ def backpropagate(node: MCTSNode|None, won: bool):
         won:    An indicator of whether the bot won or lost the game.
 
     """
-    # Check if node is root
-    if(node.parent is None):
+    # Every node on the path gets the visit; the root keeps no win count
+    while node.parent is not None:
         node.visits += 1
-        return
-    
-    # Update the node's statistics otherwise
+        if(won):
+            node.wins += 1
+        node = node.parent
     node.visits += 1
-    if(won):
-        node.wins += 1
-    
-    # Recursively backpropagate up the tree
-    backpropagate(node.parent, won)
-    return
 
-def ucb(node: MCTSNode, is_opponent: bool):
+def update_amaf(leaf: MCTSNode, played, won: bool):
+    """ Updates the AMAF (all moves as first) statistics along the path to leaf after a playout: every child of a
+    node on the path whose action the player to move at that node played later in the simulation counts the
+    result, as if the action had been played first.
+
+    Args:
+        leaf:   The leaf the playout started from.
+        played: The moves of the playout, in order.
+        won:    An indicator of whether the bot won the playout.
+
+    """
+    path = []
+    node = leaf
+    while node is not None:
+        path.append(node)
+        node = node.parent
+    path.reverse()
+    moves = [node.parent_action for node in path[1:]] + played
+
+    # later[p] holds the moves with index parity p from depth d on; players alternate, so that is one player's
+    later = (set(), set())
+    for index in range(len(path) - 1, len(moves)):
+        later[index & 1].add(moves[index])
+    for depth in range(len(path) - 1, -1, -1):
+        if depth < len(path) - 1:
+            later[depth & 1].add(moves[depth])
+        for action, child in path[depth].child_nodes.items():
+            if action in later[depth & 1]:
+                child.amaf_visits += 1
+                if won:
+                    child.amaf_wins += 1
+
+def ucb(node: MCTSNode, is_opponent: bool, log_parent_visits: float|None = None):
     """ Calcualtes the UCB value for the given node from the perspective of the bot
 
     Args:
         node:   A node.
         is_opponent: A boolean indicating whether or not the last action was performed by the MCTS bot
+        log_parent_visits: log(node.parent.visits), computed once per selection step by the caller if given
     Returns:
         The value of the UCB function for the given node
     """
-    # Calculate the child's win rate
+    # Calculate the child's win rate, blended with its AMAF win rate when use_rave is set
     exploit = node.wins / node.visits
+    if use_rave and node.amaf_visits:
+        beta = sqrt(rave_equivalence / (3 * node.visits + rave_equivalence))
+        exploit = (1 - beta) * exploit + beta * node.amaf_wins / node.amaf_visits
 
     # If opponent, calculate the opponent's win rate
     if(is_opponent):
         exploit = 1 - exploit
 
     # Calculate the inside of the root
-    explore = log(node.parent.visits) / node.visits
+    if log_parent_visits is None:
+        log_parent_visits = log(node.parent.visits)
+    explore = log_parent_visits / node.visits
 
     # Combine the exploitation and exploration calculations
     ucb = exploit + (explore_faction * sqrt(explore))
 
     return ucb
 
-def get_best_action(root_node: MCTSNode):
+def get_best_action(root_node: MCTSNode, bot_identity: int|None = None):
     """ Selects the best action from the root node in the MCTS tree
 
     Args:
         root_node:   The root node
+        bot_identity:   The player to move at the root; when given, proven results override the visit counts
     Returns:
         action: The best action from the root node
     
     """
+    children = root_node.child_nodes
+    if bot_identity is not None:
+        # Take a proven win, and a proven loss only when every child is one
+        for action, child in children.items():
+            if child.proven == bot_identity:
+                return action
+        children = dict((action, child) for action, child in children.items()
+                        if child.proven != 3 - bot_identity) or children
+
     # Find the child with the most wins
     best_action = None
     best_score = 0
 
-    for action, child in root_node.child_nodes.items():
+    for action, child in children.items():
         if(child.visits > best_score):
             best_score = child.visits
             best_action = action
@@ -370,31 +565,258 @@ def is_win(board: Board, state, identity_of_bot: int):
     assert outcome is not None, "is_win was called on a non-terminal state"
     return outcome[identity_of_bot] == 1
 
-def think(board: Board, current_state):
+_saved_trees = {}           # bot identity -> (root node, state) of the last search, for reuse_tree
+transpositions = TranspositionTable(transposition_capacity)    # transpositions.hit_rate() covers all searches
+
+def new_game():
+    """ Forgets the trees kept from earlier moves, so the next think() starts a game from scratch. """
+    _saved_trees.clear()
+    transpositions.clear()
+    endgame_solver.clear()      # how far a solve gets within its node limit depends on the memo table
+
+def search(board: Board, current_state, iterations: int|None = None, root_node: MCTSNode|None = None,
+           time_budget: float|None = None, max_nodes: int|None = None, stats: SearchStats|None = None):
     """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    The search stops at whichever limit is reached first.
 
     Args:
         board:  The game setup.
         current_state:  The current state of the game.
+        iterations:     The maximum number of MCTS iterations, num_nodes by default unless there is a time_budget.
+        root_node:      A root node to continue searching from, a fresh one by default.
+        time_budget:    Seconds to search for, or None for no time limit.
+        max_nodes:      The maximum number of nodes in the tree, or None for no limit.
+        stats:          A SearchStats to fill in.
 
-    Returns:    The action to be taken from the current state
+    Returns:    The root node of the search tree
 
     """
+    if iterations is None and time_budget is None:
+        iterations = num_nodes
+    if stats is None:
+        stats = SearchStats()
+
     bot_identity = board.current_player(current_state) # 1 or 2
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+    if root_node is None:
+        root_actions = board.unique_actions(current_state) if collapse_symmetric_moves else \
+            board.legal_actions(current_state)
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=root_actions)
+    elif not root_node.child_nodes:
+        root_node.proven = None     # a reused leaf was solved without children; search again to find the move
+    tree_size = count_nodes(root_node) if max_nodes is not None or profile else None
+
+    def evaluate(state, played=None):
+        return is_win(board, rollout(board, state, bot_identity, played), bot_identity)
+
+    if profile:
+        def evaluate(state, played=None):
+            start = time()
+            end_state = rollout(board, state, bot_identity, played)
+            stats.add_time('rollout', time() - start)
+            stats.rollouts += 1
+            stats.rollout_plies += board.move_count(end_state) - board.move_count(state)
+            return is_win(board, end_state, bot_identity)
+
+    cache = None
+    if stats_cache_path is not None and not use_transpositions:
+        cache = stats_cache.open_cache(stats_cache_path)
+        if root_node.visits == 0:
+            stats_cache.warm(cache, root_node, board, current_state, bot_identity)
+
+    # Each mode provides one MCTS iteration, returning the depth it reached and whether it added a node
+    if use_transpositions:
+        transpositions.clear()
+        transpositions.capacity = transposition_capacity
+        root_key = board.zobrist_hash(current_state)
+        transpositions.put(root_key, root_node)
+
+        def iteration():
+            return dag_iteration(board, root_node, current_state, root_key, bot_identity, evaluate,
+                                 transpositions, explore_faction)
+
+    elif use_mutable_board:
+        mboard = MutableBoard(current_state)
+
+        def iteration():
+            node = traverse_nodes_in_place(root_node, mboard, bot_identity)
+            leaf = expand_leaf_in_place(node, mboard)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, mboard.state(), bot_identity)
+            depth = mboard.ply()
+            if solver_threshold and prove_leaf(leaf, board, mboard) is not None:
+                backpropagate(leaf, leaf.proven == bot_identity)
+                mboard.undo_to(0)
+                return depth, leaf is not node
+            backpropagate(leaf, rollout_in_place(mboard, bot_identity) == bot_identity)
+            mboard.undo_to(0)
+            return depth, leaf is not node
+
+        def profiled_iteration():
+            start = time()
+            node = traverse_nodes_in_place(root_node, mboard, bot_identity)
+            selected = time()
+            leaf = expand_leaf_in_place(node, mboard)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, mboard.state(), bot_identity)
+            expanded = time()
+            depth = mboard.ply()
+            if solver_threshold and prove_leaf(leaf, board, mboard) is not None:
+                stats.add_time('select', selected - start)
+                stats.add_time('expand', expanded - selected)
+                stats.add_time('solve', time() - expanded)
+                backpropagate(leaf, leaf.proven == bot_identity)
+                mboard.undo_to(0)
+                return depth, leaf is not node
+            won = rollout_in_place(mboard, bot_identity) == bot_identity
+            rolled_out = time()
+            stats.rollouts += 1
+            stats.rollout_plies += mboard.ply() - depth
+            backpropagate(leaf, won)
+            mboard.undo_to(0)       # counted with backpropagation
+            stats.add_time('select', selected - start)
+            stats.add_time('expand', expanded - selected)
+            stats.add_time('rollout', rolled_out - expanded)
+            stats.add_time('backpropagate', time() - rolled_out)
+            return depth, leaf is not node
+
+    else:
+        def iteration():
+            # Do MCTS - This is all you!
+            node, state = traverse_nodes(root_node, board, current_state, bot_identity)
+            leaf, state = expand_leaf(node, board, state)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, state, bot_identity)
+            if solver_threshold and prove_leaf(leaf, board, state) is not None:
+                backpropagate(leaf, leaf.proven == bot_identity)
+            elif use_rave:
+                played = []
+                won = evaluate(state, played)
+                backpropagate(leaf, won)
+                update_amaf(leaf, played, won)
+            else:
+                backpropagate(leaf, evaluate(state))
+            return node_depth(leaf), leaf is not node
+
+        def profiled_iteration():
+            start = time()
+            node, state = traverse_nodes(root_node, board, current_state, bot_identity)
+            selected = time()
+            leaf, state = expand_leaf(node, board, state)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, state, bot_identity)
+            stats.add_time('select', selected - start)
+            stats.add_time('expand', time() - selected)
+            played = [] if use_rave else None
+            start = time()
+            if solver_threshold and prove_leaf(leaf, board, state) is not None:
+                stats.add_time('solve', time() - start)
+                won = leaf.proven == bot_identity
+            else:
+                won = evaluate(state, played)
+            start = time()
+            backpropagate(leaf, won)
+            if played:
+                update_amaf(leaf, played, won)
+            stats.add_time('backpropagate', time() - start)
+            return node_depth(leaf), leaf is not node
+
+    if profile:
+        if use_transpositions:
+            # Selection, expansion and backpropagation are interleaved in this mode, so they are timed together
+            tree_iteration = iteration
+
+            def profiled_iteration():
+                start = time()
+                rollout_time = stats.phase_times.get('rollout', 0.)
+                result = tree_iteration()
+                stats.add_time('tree', time() - start - (stats.phase_times['rollout'] - rollout_time))
+                return result
+        iteration = profiled_iteration
+
+    start = time()
+    deadline = None if time_budget is None else start + time_budget
+    done = 0
+    while True:
+        if iterations is not None and done >= iterations:
+            stats.stop_reason = 'iterations'
+            break
+        if max_nodes is not None and tree_size >= max_nodes:
+            stats.stop_reason = 'nodes'
+            break
+        if root_node.proven is not None:
+            stats.stop_reason = 'proven'
+            break
+        # Reading the clock costs more than a tree step, so only check it every clock_check_interval iterations
+        if deadline is not None and done % clock_check_interval == 0 and time() >= deadline:
+            stats.stop_reason = 'time'
+            break
+
+        depth, created = iteration()
+        done += 1
+        if created:
+            stats.nodes_created += 1
+            if tree_size is not None:
+                tree_size += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+
+    stats.iterations += done
+    if cache is not None:
+        stats_cache.flush(cache, root_node, board, current_state, bot_identity)
+    stats.elapsed += time() - start
+    stats.tree_size = tree_size
+    return root_node
+
+def think(board: Board, current_state, time_budget: float|None = None, max_iterations: int|None = None,
+          max_nodes: int|None = None, return_stats: bool = False):
+    """ Chooses an action with MCTS, searching num_workers independent trees in parallel when num_workers > 1.
+    Searching stops at whichever of the time, iteration and tree size limits is reached first.
 
-    for _ in range(num_nodes):
-        state = current_state
-        node = root_node
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        time_budget:    Seconds to search for, move_time by default.
+        max_iterations: The maximum number of MCTS iterations, num_nodes by default unless there is a time budget.
+        max_nodes:      The maximum number of tree nodes, max_tree_nodes by default.
+        return_stats:   Whether to also return the SearchStats of this search.
 
-        # Do MCTS - This is all you!
-        node, state = traverse_nodes(node, board, state, board.current_player(state))
-        node, state = expand_leaf(node, board, state)
-        backpropagate(node, is_win(board, rollout(board, state, bot_identity), bot_identity))
+    Returns:    The action to be taken from the current state (and the search statistics, if return_stats is set)
+
+    """
+    if time_budget is None:
+        time_budget = move_time
+    if max_nodes is None:
+        max_nodes = max_tree_nodes
+    if max_iterations is None and time_budget is None:
+        max_iterations = num_nodes
+    stats = SearchStats()
+
+    if book_path is not None:
+        book_action = opening_book.probe(book_path, board, current_state)
+        if book_action is not None:
+            stats.stop_reason = 'book'
+            return (book_action, stats) if return_stats else book_action
+
+    if num_workers > 1:
+        root_node, stats = parallel_mcts.root_parallel_search(sys.modules[__name__], board, current_state,
+                                                              num_workers, max_iterations, time_budget, max_nodes)
+    elif reuse_tree:
+        # Continue from the subtree of the previous search that reached this state, if there is one
+        bot_identity = board.current_player(current_state)
+        root_node = None
+        if bot_identity in _saved_trees:
+            saved_root, saved_state = _saved_trees.pop(bot_identity)
+            root_node = find_subtree(saved_root, board, saved_state, current_state)
+        root_node = search(board, current_state, max_iterations, root_node, time_budget, max_nodes, stats)
+        _saved_trees[bot_identity] = (root_node, current_state)
+    else:
+        root_node = search(board, current_state, max_iterations, None, time_budget, max_nodes, stats)
 
     # Return an action, typically the most frequently used action (from the root) or the action with the best
     # estimated win rate.
-    best_action = get_best_action(root_node)
+    best_action = get_best_action(root_node, board.current_player(current_state))
     
     # print(f"Action chosen: {best_action}")
+    if return_stats:
+        return best_action, stats
     return best_action
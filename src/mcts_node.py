@@ -19,6 +19,11 @@ class MCTSNode:
 
         self.wins = 0                           # Total wins of all paths through this node.
         self.visits = 0                         # Number of times this node has been visited.
+        self.proven = None                      # Winner under perfect play (1, 2 or 0 for a draw), once proven.
+        self.amaf_wins = 0                      # Wins and visits of playouts below the parent in which the action
+        self.amaf_visits = 0                    # to this node was played by the same player (RAVE, see use_rave).
+        self.stored_visits = 0                  # Visits and wins already held by the statistics cache (stats_cache.py).
+        self.stored_wins = 0
 
     def __repr__(self):
         """
@@ -26,7 +31,8 @@ class MCTSNode:
         """
         return ' '.join(["[", str(self.parent_action),
                          "Win rate:", "{0:.0f}%".format(100 * self.wins / self.visits),
-                         "Visits:", str(self.visits),  "]"])
+                         "Visits:", str(self.visits)] +
+                        ([] if self.proven is None else ["Proven:", str(self.proven)]) + ["]"])
 
     def tree_to_string(self, horizon=1, indent=0):
         """ This method returns a string of the tree down to a defined horizon. The string is recursively constructed.
@@ -43,3 +49,76 @@ class MCTSNode:
             for child in self.child_nodes.values():
                 string += child.tree_to_string(horizon - 1, indent + 1)
         return string
+
+def find_subtree(node: MCTSNode, board, node_state, target_state, max_depth=2):
+    """ Finds the node for target_state among the descendants of node, so its search can be reused.
+
+    Args:
+        node:           The root of the previous search.
+        board:          The game setup.
+        node_state:     The state associated with node.
+        target_state:   The state to look for.
+        max_depth:      How many plies below node to look.
+
+    Returns:            The matching node, detached from its parent, or None if the tree never reached target_state.
+
+    """
+    if node_state == target_state:
+        return node
+
+    frontier = [(node, node_state)]
+    for _ in range(max_depth):
+        next_frontier = []
+        for parent, parent_state in frontier:
+            for action, child in parent.child_nodes.items():
+                child_state = board.next_state(parent_state, action)
+                if child_state == target_state:
+                    # Cutting the parent link frees the rest of the old tree.
+                    child.parent = None
+                    return child
+                next_frontier.append((child, child_state))
+        frontier = next_frontier
+    return None
+
+def node_depth(node: MCTSNode):
+    """ Returns the number of parent links between node and the root of its tree. """
+    depth = 0
+    while node.parent is not None:
+        node = node.parent
+        depth += 1
+    return depth
+
+def count_nodes(node: MCTSNode):
+    """ Returns the number of distinct nodes reachable from node, itself included. """
+    seen = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(node.child_nodes.values())
+    return len(seen)
+
+def propagate_proof(node: MCTSNode, mover: int):
+    """ Proves the ancestors of a node whose result was just proven, as far as it decides them (MCTS-Solver).
+    A node is won for the player to move there as soon as one child is, and otherwise proven once all its
+    actions have children and all of them are proven.
+
+    Args:
+        node:   A node whose proven attribute was just set.
+        mover:  The player who took the action leading to node, 1 or 2.
+
+    """
+    while node.parent is not None:
+        parent = node.parent
+        if node.proven == mover:
+            parent.proven = mover
+        else:
+            if len(parent.child_nodes) < len(parent.untried_actions):
+                return
+            results = [child.proven for child in parent.child_nodes.values()]
+            if None in results:
+                return
+            parent.proven = mover if mover in results else 0 if 0 in results else 3 - mover
+        node = parent
+        mover = 3 - mover
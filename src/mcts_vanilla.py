@@ -1,11 +1,45 @@
 
-from mcts_node import MCTSNode
+import sys
+import array_tree
+import parallel_mcts
+import tree_parallel
+import endgame_solver
+import opening_book
+import stats_cache
+from mcts_node import MCTSNode, find_subtree, node_depth, count_nodes, propagate_proof
+from search_stats import SearchStats
+from transposition import TranspositionTable, dag_iteration
 from p2_t3 import Board
+from p2_t3_mutable import MutableBoard
 from random import choice
 from math import sqrt, log
+from timeit import default_timer as time
 
 num_nodes = 1000
 explore_faction = 2.
+move_time = None            # seconds per move; when set, think() searches until it runs out instead of for num_nodes
+max_tree_nodes = None       # when set, think() also stops once the tree holds this many nodes
+clock_check_interval = 16   # iterations between clock reads when searching against a time budget
+use_mutable_board = False   # search on a single MutableBoard with push/pop instead of tuple states
+use_array_tree = False      # store the tree in preallocated typed arrays (array_tree.ArrayTree) instead of MCTSNodes
+array_tree_capacity = 1 << 16   # initial ArrayTree size in nodes; it grows by doubling when full
+use_transpositions = False  # share nodes between move orders through a Zobrist-keyed transposition table
+transposition_capacity = 200000
+reuse_tree = True           # keep the tree between moves and continue from the subtree of the actual position
+num_workers = 1             # when > 1, search this many independent trees in a process pool and merge the roots
+use_tree_parallel = False   # with num_workers > 1, grow one shared-memory tree with virtual loss instead
+book_path = None            # an opening book file (opening_book.py); think() plays its move without searching
+stats_cache_path = None     # an SQLite file (stats_cache.py) new nodes start from and each search adds its
+                            # statistics to; not used with use_array_tree or use_transpositions
+collapse_symmetric_moves = True    # a new root keeps one of each set of moves its symmetries make equivalent
+solver_threshold = 12       # below this many empty playable cells, solve new leaves exactly (endgame_solver) instead
+                            # of rolling out and prove results up the tree; 0 disables. Not used with use_array_tree
+                            # or use_transpositions
+use_rave = False            # blend AMAF statistics of the rollout moves into ucb (RAVE); tuple-state search only
+rave_equivalence = 300      # RAVE schedule: AMAF weight sqrt(k / (3 * visits + k)), k = rave_equivalence
+profile = False             # record per-phase times, rollout lengths and the tree size in the SearchStats
+batch_rollouts = 0          # when > 0, evaluate each new leaf with this many NumPy playouts (see batch_rollout);
+                            # pays off from a few hundred playouts per leaf
 
 def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
     """ Traverses the tree until the end criterion are met.
@@ -23,34 +57,32 @@ def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
         state: The state associated with that node
 
     """
-    # Check if the current node is a terminal node
-    if(board.is_ended(state)):
-        return node, state
-    
-    # Check if the current node is a leaf node
-    if(len(node.untried_actions) != len(node.child_nodes)):
-        return node, state
-    
-    # Find the child with the highest UCT score
-    max_node = None
-    max_state = None
-    max_score = 0
-    for action, child in node.child_nodes.items():
-        # Calculate child UCT score
-        UCT_score = ucb(child, board.current_player(state) != bot_identity)
-
-        # Set the child if it has a higher UCT score
-        if UCT_score > max_score:
-            max_node = child
-            max_state = board.next_state(state, action)
-            max_score = UCT_score
-    
-    # If the game ends at the child, current_player breaks
-    if(max_state is None):
-        return node, state
-    
-    # Take the node and action and recursively continue
-    return traverse_nodes(max_node, board, max_state, board.current_player(max_state))
+    while not board.is_ended(state) and len(node.untried_actions) == len(node.child_nodes) and node.proven is None:
+        # Find the child with the highest UCT score; only the chosen child's state gets built
+        max_node = None
+        max_action = None
+        max_score = 0
+        loser = 3 - board.current_player(state)     # children proven won by this player are never chosen
+        is_opponent = loser == bot_identity
+        log_visits = log(node.visits)
+        for action, child in node.child_nodes.items():
+            if child.proven == loser:
+                continue
+            UCT_score = ucb(child, is_opponent, log_visits)
+            if UCT_score > max_score:
+                max_node = child
+                max_action = action
+                max_score = UCT_score
+
+        if max_node is None:
+            break
+
+        # Continue from the chosen child, with the same perspective rule the recursive version had
+        node = max_node
+        state = board.next_state(state, max_action)
+        bot_identity = board.current_player(state)
+
+    return node, state
 
 def expand_leaf(node: MCTSNode, board: Board, state):
     """ Adds a new leaf to the tree by creating a new child node for the given node (if it is non-terminal).
@@ -65,8 +97,8 @@ def expand_leaf(node: MCTSNode, board: Board, state):
         state: The state associated with that node
 
     """
-    # Check if current node is a terminal node
-    if(board.is_ended(state)):
+    # Check if current node is a terminal node, or proven (its result needs no more search)
+    if(board.is_ended(state) or node.proven is not None):
         return node, state
     
     # Define the action that is to be taken from parent -> child
@@ -81,85 +113,225 @@ def expand_leaf(node: MCTSNode, board: Board, state):
 
     return child, child_state
 
-def rollout(board: Board, state):
+def rollout(board: Board, state, played: list|None = None):
     """ Given the state of the game, the rollout plays out the remainder randomly.
 
     Args:
         board:  The game setup.
         state:  The state of the game.
+        played: A list to append the moves of the playout to, if given.
     
     Returns:
         state: The terminal game state
 
     """
-    # Recursively call rollout() with a random action until game end
-    if(not board.is_ended(state)):
-        final_state = rollout(board, board.next_state(state, choice(board.legal_actions(state))))
-    else:
-        final_state = state
-    
-    return final_state
+    # Play random actions until the game ends
+    while(not board.is_ended(state)):
+        action = board.random_legal_action(state)
+        if played is not None:
+            played.append(action)
+        state = board.next_state(state, action)
+
+    return state
+
+def traverse_nodes_in_place(node: MCTSNode, mboard: MutableBoard, bot_identity: int):
+    """ Same selection as traverse_nodes, but plays the chosen actions onto mboard instead of building states.
+
+    Args:
+        node:           A tree node from which the search is traversing.
+        mboard:         The mutable board, positioned at node's state.
+        bot_identity:   The bot's identity, either 1 or 2
+
+    Returns:
+        node: A node from which the next stage of the search can proceed, with mboard positioned at its state.
 
-def backpropagate(node: MCTSNode|None, won: bool):
+    """
+    while not mboard.is_ended() and len(node.untried_actions) == len(node.child_nodes) and node.proven is None:
+        # Find the child with the highest UCT score
+        max_node = None
+        max_action = None
+        max_score = 0
+        loser = 3 - mboard.current_player()
+        is_opponent = loser == bot_identity
+        log_visits = log(node.visits)
+        for action, child in node.child_nodes.items():
+            if child.proven == loser:
+                continue
+            UCT_score = ucb(child, is_opponent, log_visits)
+            if UCT_score > max_score:
+                max_node = child
+                max_action = action
+                max_score = UCT_score
+
+        if max_node is None:
+            break
+
+        mboard.push(max_action)
+        node = max_node
+        bot_identity = mboard.current_player()
+
+    return node
+
+def expand_leaf_in_place(node: MCTSNode, mboard: MutableBoard):
+    """ Same as expand_leaf, but plays the new child's action onto mboard.
+
+    Args:
+        node:   The node for which a child will be added.
+        mboard: The mutable board, positioned at node's state.
+
+    Returns:
+        node: The added child node, with mboard positioned at its state.
+
+    """
+    if mboard.is_ended() or node.proven is not None:
+        return node
+
+    action_taken = choice(node.untried_actions)
+    mboard.push(action_taken)
+    child = MCTSNode(parent=node, parent_action=action_taken, action_list=mboard.legal_actions())
+    node.child_nodes[action_taken] = child
+
+    return child
+
+def rollout_in_place(mboard: MutableBoard):
+    """ Plays random moves onto mboard until the game ends.
+
+    Args:
+        mboard: The mutable board to play out. The caller is responsible for undoing the moves.
+
+    Returns:
+        The winner of the playout, 1 or 2, or 0 for a draw.
+
+    """
+    while not mboard.is_ended():
+        mboard.push(mboard.random_legal_action())
+    return mboard.winner()
+
+def prove_leaf(node: MCTSNode, board: Board, state):
+    """ Solves a leaf whose game is over or has fewer than solver_threshold empty playable cells left with
+    endgame_solver, and proves the ancestors its result decides.
+
+    Args:
+        node:   The leaf reached by this iteration.
+        board:  The game setup.
+        state:  The state associated with node, a tuple state, a PackedBoard int state or a MutableBoard.
+
+    Returns:
+        The winner the leaf is proven for (1, 2 or 0 for a draw), or None if it stays unproven.
+
+    """
+    if node.proven is None:
+        # The solver reads tuple states (or anything indexable like one)
+        solver_state = board.to_tuple(state) if isinstance(state, int) else state
+        if board.is_ended(state) or endgame_solver.playable_cells(solver_state) < solver_threshold:
+            node.proven = endgame_solver.solve(solver_state)
+            if node.proven is not None:
+                propagate_proof(node, board.previous_player(state))
+    return node.proven
+
+def backpropagate(node: MCTSNode|None, won: bool|int, playouts: int = 1):
     """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
 
     Args:
-        node:   A leaf node.
-        won:    An indicator of whether the bot won or lost the game.
+        node:       A leaf node.
+        won:        An indicator of whether the bot won or lost the game, or the number of wins out of playouts.
+        playouts:   The number of games the result covers.
 
     """
-    # Check if node is root
-    if(node.parent is None):
-        node.visits += 1
-        return
-    
-    # Update the node's statistics otherwise
-    node.visits += 1
-    if(won):
-        node.wins += 1
-    
-    # Recursively backpropagate up the tree
-    backpropagate(node.parent, won)
-    return
+    # Every node on the path gets the visit; the root keeps no win count
+    while node.parent is not None:
+        node.visits += playouts
+        if(won):
+            node.wins += won
+        node = node.parent
+    node.visits += playouts
+
+def update_amaf(leaf: MCTSNode, played, won: bool):
+    """ Updates the AMAF (all moves as first) statistics along the path to leaf after a playout: every child of a
+    node on the path whose action the player to move at that node played later in the simulation counts the
+    result, as if the action had been played first.
 
-def ucb(node: MCTSNode, is_opponent: bool):
+    Args:
+        leaf:   The leaf the playout started from.
+        played: The moves of the playout, in order.
+        won:    An indicator of whether the bot won the playout.
+
+    """
+    path = []
+    node = leaf
+    while node is not None:
+        path.append(node)
+        node = node.parent
+    path.reverse()
+    moves = [node.parent_action for node in path[1:]] + played
+
+    # later[p] holds the moves with index parity p from depth d on; players alternate, so that is one player's
+    later = (set(), set())
+    for index in range(len(path) - 1, len(moves)):
+        later[index & 1].add(moves[index])
+    for depth in range(len(path) - 1, -1, -1):
+        if depth < len(path) - 1:
+            later[depth & 1].add(moves[depth])
+        for action, child in path[depth].child_nodes.items():
+            if action in later[depth & 1]:
+                child.amaf_visits += 1
+                if won:
+                    child.amaf_wins += 1
+
+def ucb(node: MCTSNode, is_opponent: bool, log_parent_visits: float|None = None):
     """ Calcualtes the UCB value for the given node from the perspective of the bot
 
     Args:
         node:   A node.
         is_opponent: A boolean indicating whether or not the last action was performed by the MCTS bot
+        log_parent_visits: log(node.parent.visits), computed once per selection step by the caller if given
     Returns:
         The value of the UCB function for the given node
     """
-    # Calculate the child's win rate
+    # Calculate the child's win rate, blended with its AMAF win rate when use_rave is set
     exploit = node.wins / node.visits
+    if use_rave and node.amaf_visits:
+        beta = sqrt(rave_equivalence / (3 * node.visits + rave_equivalence))
+        exploit = (1 - beta) * exploit + beta * node.amaf_wins / node.amaf_visits
 
     # If opponent, calculate the opponent's win rate
     if(is_opponent):
         exploit = 1 - exploit
 
     # Calculate the inside of the root
-    explore = log(node.parent.visits) / node.visits
+    if log_parent_visits is None:
+        log_parent_visits = log(node.parent.visits)
+    explore = log_parent_visits / node.visits
 
     # Combine the exploitation and exploration calculations
     ucb = exploit + (explore_faction * sqrt(explore))
 
     return ucb
 
-def get_best_action(root_node: MCTSNode):
+def get_best_action(root_node: MCTSNode, bot_identity: int|None = None):
     """ Selects the best action from the root node in the MCTS tree
 
     Args:
         root_node:   The root node
+        bot_identity:   The player to move at the root; when given, proven results override the visit counts
     Returns:
         action: The best action from the root node
     
     """
+    children = root_node.child_nodes
+    if bot_identity is not None:
+        # Take a proven win, and a proven loss only when every child is one
+        for action, child in children.items():
+            if child.proven == bot_identity:
+                return action
+        children = dict((action, child) for action, child in children.items()
+                        if child.proven != 3 - bot_identity) or children
+
     # Find the child with the most wins
     best_action = None
     best_score = 0
 
-    for action, child in root_node.child_nodes.items():
+    for action, child in children.items():
         if(child.visits > best_score):
             best_score = child.visits
             best_action = action
@@ -172,31 +344,298 @@ def is_win(board: Board, state, identity_of_bot: int):
     assert outcome is not None, "is_win was called on a non-terminal state"
     return outcome[identity_of_bot] == 1
 
-def think(board: Board, current_state):
+_saved_trees = {}           # bot identity -> (root node, state) of the last search, for reuse_tree
+transpositions = TranspositionTable(transposition_capacity)    # transpositions.hit_rate() covers all searches
+_array_tree = None          # the ArrayTree reused by every use_array_tree search, allocated on first use
+
+def new_game():
+    """ Forgets the trees kept from earlier moves, so the next think() starts a game from scratch. """
+    _saved_trees.clear()
+    transpositions.clear()
+    endgame_solver.clear()      # how far a solve gets within its node limit depends on the memo table
+
+def search(board: Board, current_state, iterations: int|None = None, root_node: MCTSNode|None = None,
+           time_budget: float|None = None, max_nodes: int|None = None, stats: SearchStats|None = None):
     """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    The search stops at whichever limit is reached first.
 
     Args:
         board:  The game setup.
         current_state:  The current state of the game.
+        iterations:     The maximum number of MCTS iterations, num_nodes by default unless there is a time_budget.
+        root_node:      A root node to continue searching from, a fresh one by default. With use_array_tree the
+                        search always starts from an empty ArrayTree and this is ignored.
+        time_budget:    Seconds to search for, or None for no time limit.
+        max_nodes:      The maximum number of nodes in the tree, or None for no limit.
+        stats:          A SearchStats to fill in.
 
-    Returns:    The action to be taken from the current state
+    Returns:    The root node of the search tree (with use_array_tree, a copy of the root and its children)
 
     """
+    global _array_tree
+    if iterations is None and time_budget is None:
+        iterations = num_nodes
+    if stats is None:
+        stats = SearchStats()
+
     bot_identity = board.current_player(current_state) # 1 or 2
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+    if root_node is None:
+        root_actions = board.unique_actions(current_state) if collapse_symmetric_moves else \
+            board.legal_actions(current_state)
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=root_actions)
+    elif not root_node.child_nodes:
+        root_node.proven = None     # a reused leaf was solved without children; search again to find the move
+    tree_size = count_nodes(root_node) if max_nodes is not None or profile else None
+
+    def evaluate(state, played=None):
+        return board.random_playout(state, played=played) == bot_identity
+
+    if profile:
+        def evaluate(state, played=None):
+            # The same random_playout, with its moves collected to measure its length
+            if played is None:
+                played = []
+            length = len(played)
+            start = time()
+            winner = board.random_playout(state, played=played)
+            stats.add_time('rollout', time() - start)
+            stats.rollouts += 1
+            stats.rollout_plies += len(played) - length
+            return winner == bot_identity
+
+    cache = None
+    if stats_cache_path is not None and not (use_array_tree or use_transpositions):
+        cache = stats_cache.open_cache(stats_cache_path)
+        if root_node.visits == 0:
+            stats_cache.warm(cache, root_node, board, current_state, bot_identity)
+
+    # Each mode provides one MCTS iteration, returning the depth it reached and whether it added a node
+    if use_array_tree:
+        if _array_tree is None:
+            _array_tree = array_tree.ArrayTree(array_tree_capacity)
+        tree = _array_tree
+        tree.reset()
+        if collapse_symmetric_moves:
+            tree.expand(0, board.unique_actions(current_state))
+        tree_size = 1 if tree_size is not None else None
+
+        def iteration():
+            return array_tree.iterate(tree, board, current_state, bot_identity, evaluate, explore_faction)
+
+    elif use_transpositions:
+        transpositions.clear()
+        transpositions.capacity = transposition_capacity
+        root_key = board.zobrist_hash(current_state)
+        transpositions.put(root_key, root_node)
+
+        def iteration():
+            return dag_iteration(board, root_node, current_state, root_key, bot_identity, evaluate,
+                                 transpositions, explore_faction)
+
+    elif use_mutable_board:
+        mboard = MutableBoard(current_state)
+
+        def iteration():
+            node = traverse_nodes_in_place(root_node, mboard, bot_identity)
+            leaf = expand_leaf_in_place(node, mboard)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, mboard.state(), bot_identity)
+            depth = mboard.ply()
+            if solver_threshold and prove_leaf(leaf, board, mboard) is not None:
+                backpropagate(leaf, leaf.proven == bot_identity)
+                mboard.undo_to(0)
+                return depth, leaf is not node
+            backpropagate(leaf, rollout_in_place(mboard) == bot_identity)
+            mboard.undo_to(0)
+            return depth, leaf is not node
+
+        def profiled_iteration():
+            start = time()
+            node = traverse_nodes_in_place(root_node, mboard, bot_identity)
+            selected = time()
+            leaf = expand_leaf_in_place(node, mboard)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, mboard.state(), bot_identity)
+            expanded = time()
+            depth = mboard.ply()
+            if solver_threshold and prove_leaf(leaf, board, mboard) is not None:
+                stats.add_time('select', selected - start)
+                stats.add_time('expand', expanded - selected)
+                stats.add_time('solve', time() - expanded)
+                backpropagate(leaf, leaf.proven == bot_identity)
+                mboard.undo_to(0)
+                return depth, leaf is not node
+            won = rollout_in_place(mboard) == bot_identity
+            rolled_out = time()
+            stats.rollouts += 1
+            stats.rollout_plies += mboard.ply() - depth
+            backpropagate(leaf, won)
+            mboard.undo_to(0)       # counted with backpropagation
+            stats.add_time('select', selected - start)
+            stats.add_time('expand', expanded - selected)
+            stats.add_time('rollout', rolled_out - expanded)
+            stats.add_time('backpropagate', time() - rolled_out)
+            return depth, leaf is not node
+
+    else:
+        if batch_rollouts:
+            import batch_rollout    # NumPy is only needed for this mode
+
+        def iteration():
+            # Do MCTS - This is all you!
+            node, state = traverse_nodes(root_node, board, current_state, bot_identity)
+            leaf, state = expand_leaf(node, board, state)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, state, bot_identity)
+            if solver_threshold and prove_leaf(leaf, board, state) is not None:
+                backpropagate(leaf, leaf.proven == bot_identity)
+            elif batch_rollouts:
+                winners = batch_rollout.simulate([state] * batch_rollouts)
+                backpropagate(leaf, int((winners == bot_identity).sum()), batch_rollouts)
+            elif use_rave:
+                played = []
+                won = evaluate(state, played)
+                backpropagate(leaf, won)
+                update_amaf(leaf, played, won)
+            else:
+                # Same result as is_win(board, rollout(board, state), bot_identity), without building the states
+                backpropagate(leaf, board.random_playout(state) == bot_identity)
+            return node_depth(leaf), leaf is not node
+
+        def profiled_iteration():
+            start = time()
+            node, state = traverse_nodes(root_node, board, current_state, bot_identity)
+            selected = time()
+            leaf, state = expand_leaf(node, board, state)
+            if cache is not None and leaf is not node and node.visits >= stats_cache.min_visits:
+                stats_cache.warm(cache, leaf, board, state, bot_identity)
+            stats.add_time('select', selected - start)
+            stats.add_time('expand', time() - selected)
+            played = [] if use_rave else None
+            start = time()
+            if solver_threshold and prove_leaf(leaf, board, state) is not None:
+                stats.add_time('solve', time() - start)
+                won, playouts = leaf.proven == bot_identity, 1
+            elif batch_rollouts:
+                winners = batch_rollout.simulate([state] * batch_rollouts)
+                stats.add_time('rollout', time() - start)
+                won, playouts = int((winners == bot_identity).sum()), batch_rollouts
+            else:
+                won, playouts = evaluate(state, played), 1
+            start = time()
+            backpropagate(leaf, won, playouts)
+            if played:
+                update_amaf(leaf, played, won)
+            stats.add_time('backpropagate', time() - start)
+            return node_depth(leaf), leaf is not node
+
+    if profile:
+        if use_array_tree or use_transpositions:
+            # These modes interleave selection, expansion and backpropagation, so they are timed together
+            tree_iteration = iteration
+
+            def profiled_iteration():
+                start = time()
+                rollout_time = stats.phase_times.get('rollout', 0.)
+                result = tree_iteration()
+                stats.add_time('tree', time() - start - (stats.phase_times['rollout'] - rollout_time))
+                return result
+        iteration = profiled_iteration
+
+    start = time()
+    deadline = None if time_budget is None else start + time_budget
+    done = 0
+    while True:
+        if iterations is not None and done >= iterations:
+            stats.stop_reason = 'iterations'
+            break
+        if max_nodes is not None and tree_size >= max_nodes:
+            stats.stop_reason = 'nodes'
+            break
+        if root_node.proven is not None:
+            stats.stop_reason = 'proven'
+            break
+        # Reading the clock costs more than a tree step, so only check it every clock_check_interval iterations
+        if deadline is not None and done % clock_check_interval == 0 and time() >= deadline:
+            stats.stop_reason = 'time'
+            break
+
+        depth, created = iteration()
+        done += 1
+        if created:
+            stats.nodes_created += 1
+            if tree_size is not None:
+                tree_size += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+
+    stats.iterations += done
+    if cache is not None:
+        stats_cache.flush(cache, root_node, board, current_state, bot_identity)
+    stats.elapsed += time() - start
+    stats.tree_size = tree_size
+    if use_array_tree:
+        return _array_tree.root_node(board, current_state)
+    return root_node
+
+def think(board: Board, current_state, time_budget: float|None = None, max_iterations: int|None = None,
+          max_nodes: int|None = None, return_stats: bool = False):
+    """ Chooses an action with MCTS, using num_workers processes (root- or tree-parallel) when num_workers > 1.
+    Searching stops at whichever of the time, iteration and tree size limits is reached first.
 
-    for _ in range(num_nodes):
-        state = current_state
-        node = root_node
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        time_budget:    Seconds to search for, move_time by default.
+        max_iterations: The maximum number of MCTS iterations, num_nodes by default unless there is a time budget.
+        max_nodes:      The maximum number of tree nodes, max_tree_nodes by default.
+        return_stats:   Whether to also return the SearchStats of this search.
 
-        # Do MCTS - This is all you!
-        node, state = traverse_nodes(node, board, state, board.current_player(state))
-        node, state = expand_leaf(node, board, state)
-        backpropagate(node, is_win(board, rollout(board, state), bot_identity))
+    Returns:    The action to be taken from the current state (and the search statistics, if return_stats is set)
+
+    """
+    if time_budget is None:
+        time_budget = move_time
+    if max_nodes is None:
+        max_nodes = max_tree_nodes
+    if max_iterations is None and time_budget is None:
+        max_iterations = num_nodes
+    stats = SearchStats()
+
+    if book_path is not None:
+        book_action = opening_book.probe(book_path, board, current_state)
+        if book_action is not None:
+            stats.stop_reason = 'book'
+            return (book_action, stats) if return_stats else book_action
+
+    if num_workers > 1 and use_tree_parallel:
+        # Tree-parallel search runs a fixed number of iterations; time and node limits do not apply
+        root_node, report = tree_parallel.tree_parallel_search(board, current_state, num_workers,
+                                                               num_workers * (max_iterations or num_nodes),
+                                                               explore_faction)
+        stats.iterations, stats.elapsed = report['iterations'], report['elapsed']
+        stats.tree_size, stats.max_depth = report['tree_size'], report['max_depth']
+        stats.stop_reason = 'iterations'
+    elif num_workers > 1:
+        root_node, stats = parallel_mcts.root_parallel_search(sys.modules[__name__], board, current_state,
+                                                              num_workers, max_iterations, time_budget, max_nodes)
+    elif reuse_tree:
+        # Continue from the subtree of the previous search that reached this state, if there is one
+        bot_identity = board.current_player(current_state)
+        root_node = None
+        if bot_identity in _saved_trees:
+            saved_root, saved_state = _saved_trees.pop(bot_identity)
+            root_node = find_subtree(saved_root, board, saved_state, current_state)
+        root_node = search(board, current_state, max_iterations, root_node, time_budget, max_nodes, stats)
+        _saved_trees[bot_identity] = (root_node, current_state)
+    else:
+        root_node = search(board, current_state, max_iterations, None, time_budget, max_nodes, stats)
 
     # Return an action, typically the most frequently used action (from the root) or the action with the best
     # estimated win rate.
-    best_action = get_best_action(root_node)
+    best_action = get_best_action(root_node, board.current_player(current_state))
     
     # print(f"Action chosen: {best_action}")
+    if return_stats:
+        return best_action, stats
     return best_action
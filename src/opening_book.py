@@ -0,0 +1,170 @@
+""" Opening book: the moves long offline searches chose in early positions, for the bots to play instantly.
+
+The builder searches the start position with a bot's search() for --iterations MCTS iterations, records the
+chosen move, and goes on to the positions after the --width most visited moves, down to --depth plies.
+
+Positions are stored in canonical form (p2_t3.canonical_state), so one record serves all 8 symmetric forms
+of a position, and the builder never searches two of them. The book file is a 16-byte header (magic, format
+version, record count) followed by fixed-size records sorted by key, the 64-bit Zobrist hash of the
+canonical form (p2_t3.Board.canonical_hash), with the action given in the canonical orientation:
+
+    key (uint64) | action (uint8) | padding (3 bytes) | move visits (uint32) | move wins (uint32) | position visits (uint32)
+
+all little-endian, with the action packed as 9 * (3 * R + C) + (3 * r + c). OpeningBook maps the file and
+binary-searches the records in place, so opening a book costs the same whatever its size.
+
+Usage:
+    python opening_book.py FILE [--depth 2] [--width 3] [--iterations 20000] [--bot mcts_vanilla] [--seed 0]
+"""
+import argparse
+import importlib
+import mmap
+import os
+import random
+import struct
+from timeit import default_timer as time
+import p2_t3
+
+MAGIC = b'UTTTBOOK'
+VERSION = 2
+header = struct.Struct('<8sII')     # magic, version, record count
+record = struct.Struct('<QB3xIII')  # key, action, move visits, move wins, position visits
+
+_books = {}                 # path -> OpeningBook, opened on first use by probe()
+
+
+def pack_action(action):
+    R, C, r, c = action
+    return 9 * (3 * R + C) + 3 * r + c
+
+
+def unpack_action(index: int):
+    return index // 27, (index // 9) % 3, (index % 9) // 3, index % 3
+
+
+class OpeningBook(object):
+    """ A book file mapped into memory. Lookups binary-search the records without reading the rest. """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < header.size:
+                raise ValueError("%s is not an opening book" % path)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = header.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or header.size + count * record.size != size:
+            self._map.close()
+            raise ValueError("%s is not a version %d opening book" % (path, VERSION))
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key: int):
+        """ Returns (action, move visits, move wins, position visits) for the position hashed as key, or None. """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = header.size + middle * record.size
+            middle_key = struct.unpack_from('<Q', self._map, offset)[0]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                _, action, visits, wins, total = record.unpack_from(self._map, offset)
+                return unpack_action(action), visits, wins, total
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+def probe(path: str, board, state):
+    """ Returns the book move for state from the book file at path, or None if the book has no legal move for it.
+
+    Books stay open (mapped) after the first probe, so later probes only cost the lookup.
+    """
+    book = _books.get(path)
+    if book is None:
+        book = _books[path] = OpeningBook(path)
+    canonical, transform = board.canonical_state(state)
+    entry = book.lookup(board.zobrist_hash(canonical))
+    if entry is None:
+        return None
+    action = board.transform_action(entry[0], p2_t3.inverse_transforms[transform])
+    if not board.is_legal(state, action):
+        return None     # a hash collision with a position the book does not cover
+    return action
+
+
+def write_book(path: str, entries):
+    """ Writes a book file from a dict of key -> (action, move visits, move wins, position visits).
+
+    The file is written next to path and renamed into place, so readers never see a partial book.
+    """
+    temp_path = '%s.%d' % (path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(header.pack(MAGIC, VERSION, len(entries)))
+        for key in sorted(entries):
+            action, visits, wins, total = entries[key]
+            f.write(record.pack(key, pack_action(action), visits, int(wins), total))
+    os.replace(temp_path, path)
+
+
+def build(module, depth: int, width: int, iterations: int, seed: int = 0, log=print):
+    """ Searches the opening positions and returns their book entries.
+
+    Args:
+        module:     The bot module whose search(board, state, iterations) and get_best_action are used.
+        depth:      The number of plies from the start to cover; positions after depth moves are not searched.
+        width:      How many of the most visited moves of each position lead to positions searched next.
+        iterations: MCTS iterations per position.
+        seed:       The random seed, so the same arguments build the same book.
+        log:        Called with a progress line after each position, or None.
+
+    Returns:    A dict of canonical Zobrist key -> (canonical action, move visits, move wins, position visits).
+
+    """
+    random.seed(seed)
+    board = p2_t3.Board()
+    entries = {}
+    frontier = [board.starting_state()]
+    for ply in range(depth):
+        next_frontier = []
+        for state in frontier:
+            canonical, transform = board.canonical_state(state)
+            key = board.zobrist_hash(canonical)
+            if key in entries or board.is_ended(state):
+                continue
+            start = time()
+            root_node = module.search(board, state, iterations)
+            action = module.get_best_action(root_node, board.current_player(state))
+            child = root_node.child_nodes[action]
+            entries[key] = (board.transform_action(action, transform), child.visits, child.wins, root_node.visits)
+            if log:
+                log("ply %d, position %d: %s, %d of %d visits, %.0f%% wins (%.1fs)"
+                    % (ply, len(entries), action, child.visits, root_node.visits,
+                       100 * child.wins / max(child.visits, 1), time() - start))
+
+            ranked = sorted(root_node.child_nodes.items(), key=lambda item: item[1].visits, reverse=True)
+            next_frontier.extend(board.next_state(state, action) for action, _ in ranked[:width])
+        frontier = next_frontier
+    return entries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Builds an opening book by searching the early positions.")
+    parser.add_argument('path', metavar='FILE', help="the book file to write")
+    parser.add_argument('--depth', type=int, default=2, help="plies from the start to cover")
+    parser.add_argument('--width', type=int, default=3, help="most visited moves to follow from each position")
+    parser.add_argument('--iterations', type=int, default=20000, help="MCTS iterations per position")
+    parser.add_argument('--bot', choices=('mcts_vanilla', 'mcts_modified'), default='mcts_vanilla',
+                        help="the bot whose search fills the book")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time()
+    entries = build(importlib.import_module(args.bot), args.depth, args.width, args.iterations, args.seed)
+    write_book(args.path, entries)
+    print("Wrote %d positions to %s in %.0f seconds" % (len(entries), args.path, time() - start))
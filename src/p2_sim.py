@@ -1,68 +1,143 @@
-import sys
+""" Plays a seeded tournament between two bots and prints the win counts.
+
+Usage: python p2_sim.py p1 p2 [--rounds N] [--workers W] [--seed S] [--nodes N [N]] [--move-time S [S]]
+                        [--sprt ELO0 ELO1 [--alpha A] [--beta B]] [--book FILE] [--cache FILE] [--rave p1|p2|both]
+                        [--output FILE.jsonl] [--stats FILE.json|FILE.csv] [--profile]
+
+The bots alternate colours: p1 moves first in even-numbered games and p2 in odd-numbered ones. Games are
+spread over --workers processes and give the same results for the same --seed whatever the worker count,
+unless --move-time is used (see tournament.py). --nodes and --move-time set the MCTS bots' num_nodes and
+move_time, one value for both bots or one each. --book gives both MCTS bots an opening book to play from
+(see opening_book.py). --cache gives them a statistics file that every search warms its new nodes from and
+adds its results to (see stats_cache.py); it is shared by all workers and persists between runs. --rave turns
+on RAVE (use_rave) for one or both bots; rave_comparison.py uses it to measure what RAVE saves.
+
+With --output, each game's result (winner, move count, seconds per move, ...) is appended to FILE as a JSON
+line as soon as the game finishes.
+
+The Elo difference of p1 over p2 is reported with a 95% confidence interval. With --sprt ELO0 ELO1 the
+match stops as soon as a sequential probability ratio test accepts either H0: "p1 is ELO0 Elo stronger than
+p2" or H1: "p1 is ELO1 Elo stronger" (for example --sprt 0 20 to test for a 20 Elo gain), with error rates
+--alpha and --beta, or after --rounds games. The test takes games in game order, so it stops at the same
+game whatever the worker count.
+
+With --stats, every move of an MCTS bot is recorded with its search
+statistics (iterations, time, nodes/sec, tree size and depth, and with --profile the per-phase times and
+rollout lengths), and the records are written to FILE as a JSON list or as CSV, depending on the extension.
+"""
+import argparse
+import csv
+import json
 from timeit import default_timer as time
-import p2_t3
-import mcts_vanilla
-import mcts_modified
-import random_bot
-import rollout_bot
+import elo
+import tournament
 
-players = dict(
-    random_bot=random_bot.think,
-    rollout_bot=rollout_bot.think,
-    mcts_vanilla=mcts_vanilla.think,
-    mcts_modified=mcts_modified.think,
-)
 
-board = p2_t3.Board()
-state0 = board.starting_state()
+def write_stats(path, records):
+    """ Writes per-move records to path, as CSV if it ends in .csv and as JSON otherwise. """
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.csv'):
+            fields = []
+            for record in records:
+                fields.extend(field for field in record if field not in fields)
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+        else:
+            json.dump(records, f, indent=1)
 
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
 
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in "+players.keys().join(","))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in "+players.keys().join(","))
-    exit(1)
+def bot_settings(args, side):
+    """ Returns the module settings of bot side (0 for p1, 1 for p2) given on the command line. """
+    settings = {}
+    for option, name in (('nodes', 'num_nodes'), ('move_time', 'move_time')):
+        values = getattr(args, option)
+        if values:
+            settings[name] = values[min(side, len(values) - 1)]
+    if args.book:
+        settings['book_path'] = args.book
+    if args.cache:
+        settings['stats_cache_path'] = args.cache
+    if args.rave in ('both', ('p1', 'p2')[side]):
+        settings['use_rave'] = True
+    if args.profile:
+        settings['profile'] = True
+    return settings
 
-player1 = players[p1]
-player2 = players[p2]
 
-rounds = 100
-wins = {'draw':0, 1:0, 2:0}
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plays a seeded tournament between two bots.")
+    parser.add_argument('p1', choices=tournament.bot_names)
+    parser.add_argument('p2', choices=tournament.bot_names)
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1, help="processes to play games in")
+    parser.add_argument('--seed', type=int, default=0, help="tournament seed")
+    parser.add_argument('--nodes', type=int, nargs='+', metavar='N', help="MCTS iterations per move, for both or each bot")
+    parser.add_argument('--move-time', type=float, nargs='+', metavar='S', help="MCTS seconds per move, for both or each bot")
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help="stop once p1 is shown to be ELO0 (H0) or ELO1 (H1) Elo stronger than p2")
+    parser.add_argument('--alpha', type=float, default=0.05, help="SPRT probability of wrongly accepting H1")
+    parser.add_argument('--beta', type=float, default=0.05, help="SPRT probability of wrongly accepting H0")
+    parser.add_argument('--book', metavar='FILE', help="opening book for the MCTS bots")
+    parser.add_argument('--cache', metavar='FILE', help="persistent node statistics file for the MCTS bots")
+    parser.add_argument('--rave', choices=('p1', 'p2', 'both'), help="use RAVE in the MCTS bot(s) on that side")
+    parser.add_argument('--output', metavar='FILE', help="append per-game results to FILE as JSON lines")
+    parser.add_argument('--stats', metavar='FILE', help="write per-move search statistics to FILE (.json or .csv)")
+    parser.add_argument('--profile', action='store_true', help="also record per-phase times and rollout lengths")
+    args = parser.parse_args()
 
-start = time()  # To log how much time the simulation takes.
+    p1 = args.p1
+    p2 = args.p2
+    names = {'a': p1, 'b': p2 if p2 != p1 else p2 + ' (B)'}
+    settings = (bot_settings(args, 0), bot_settings(args, 1))
+    output = open(args.output, 'a') if args.output else None
 
-for i in range(rounds):
+    start = time()  # To log how much time the simulation takes.
 
+    results = []
+    games = tournament.run_tournament((p1, p2), args.rounds, args.seed, args.workers, settings,
+                                      collect_stats=bool(args.stats))
+    sprt = None
+    if args.sprt:
+        sprt = elo.SPRT(args.sprt[0], args.sprt[1], args.alpha, args.beta)
+        games = tournament.in_order(games)
+
+    for result in games:
+        results.append(result)
+        if output:
+            tournament.write_jsonl(output, {key: value for key, value in result.items() if key != 'stats'})
+        outcome = 'draw' if result['result'] == 'draw' else names[result['result']] + ' wins'
+        print("Game %d: %s (player 1) vs %s (player 2), %s in %d moves"
+              % (result['game'], result['player1'], result['player2'], outcome, result['moves']))
+        if sprt:
+            sprt.add(tournament.score(result))
+            if sprt.status():
+                break
+    games.close()
+
+    if output:
+        output.close()
+
+    summary = tournament.summarize(results)
     print("")
-    print("Round %d, fight!" % i)
-
-    state = state0
-    last_action = None
-    current_player = player1
-    while not board.is_ended(state):
-        last_action = current_player(board, state)
-        state = board.next_state(state, last_action)
-        current_player = player1 if current_player == player2 else player2
-    print("Finished!")
-    print()
-    final_score = board.points_values(state)
-    winner = 'draw'
-    if final_score[1] == 1:
-        winner = 1
-    elif final_score[2] == 1:
-        winner = 2
-    print("The %s bot wins this round! (%s)" % (winner, str(final_score)))
-    wins[winner] = wins.get(winner, 0) + 1
-
-print("")
-print("Final win counts:", dict(wins))
-
-# Also output the time elapsed.
-end = time()
-print(end - start, ' seconds')
+    print("Final win counts:", {names['a']: summary['a'], names['b']: summary['b'], 'draw': summary['draw']})
+    print("Wins by colour:", {1: summary['player1'], 2: summary['player2']})
+    rating, low, high = elo.elo_interval(summary['a'], summary['b'], summary['draw'])
+    print("Elo of %s over %s: %.1f (95%% CI %.1f to %.1f), likelihood of superiority %.1f%%"
+          % (names['a'], names['b'], rating, low, high,
+             100 * elo.likelihood_of_superiority(summary['a'], summary['b'])))
+    if sprt:
+        status = sprt.status()
+        print(sprt)
+        print("SPRT: %s after %d games" % ({'H1': "H1 accepted", 'H0': "H0 accepted"}.get(status, "no decision"),
+                                           len(results)))
+
+    # Also output the time elapsed.
+    end = time()
+    print(end - start, ' seconds')
+
+    if args.stats:
+        results.sort(key=lambda result: result['game'])
+        records = [record for result in results for record in result['stats']]
+        write_stats(args.stats, records)
+        print("Wrote %d move records to %s" % (len(records), args.stats))
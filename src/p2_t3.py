@@ -18,6 +18,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import random
+
 num_players = 2
 
 positions = dict(
@@ -194,10 +196,9 @@ class Board(object):
         state[board_index + player_index] |= positions[(r, c)]
         updated_board = state[board_index + player_index]
 
-        full = (state[board_index] | state[board_index + 1] == 0x1ff)
-        if any(updated_board & w == w for w in self.wins):
+        if win_table[updated_board]:
             state[18 + player_index] |= positions[(R, C)]
-        elif full:
+        elif full_table[state[board_index] | state[board_index + 1]]:
             state[18] |= positions[(R, C)]
             state[19] |= positions[(R, C)]
 
@@ -208,6 +209,38 @@ class Board(object):
 
         return tuple(state)
 
+    def zobrist_hash(self, state):
+        """ Returns the 64-bit Zobrist hash of state, computed from scratch. """
+        key = zobrist_player if state[-1] == 2 else 0
+        for k in range(9):
+            for player_index in range(2):
+                cells = state[2 * k + player_index]
+                for cell in free_cells_table[cells]:
+                    key ^= zobrist_cells[player_index][k][cell]
+        for player_index in range(2):
+            for k in free_cells_table[state[18 + player_index]]:
+                key ^= zobrist_big[player_index][k]
+        if state[20] is None:
+            return key ^ zobrist_constraint[9]
+        return key ^ zobrist_constraint[3 * state[20] + state[21]]
+
+    def next_state_hashed(self, state, key, action):
+        """ Returns next_state(state, action) and its Zobrist hash, updated incrementally from key, the hash of state. """
+        R, C, r, c = action
+        k = 3 * R + C
+        new_state = self.next_state(state, action)
+
+        key ^= zobrist_cells[state[-1] - 1][k][3 * r + c] ^ zobrist_player
+        if new_state[18] != state[18]:
+            key ^= zobrist_big[0][k]
+        if new_state[19] != state[19]:
+            key ^= zobrist_big[1][k]
+        old_constraint = 9 if state[20] is None else 3 * state[20] + state[21]
+        new_constraint = 9 if new_state[20] is None else 3 * new_state[20] + new_state[21]
+        key ^= zobrist_constraint[old_constraint] ^ zobrist_constraint[new_constraint]
+
+        return new_state, key
+
     def is_legal(self, state, action):
         R, C, r, c = action
 
@@ -239,27 +272,110 @@ class Board(object):
         return (R, C) == (state[20], state[21])
 
     def legal_actions(self, state):
-        R, C = state[20], state[21]
-        Rset, Cset = (R,), (C,)
-        if R is None:
-            Rset, Cset = range(3), range(3)
-
-        occupied = [
-            state[2 * x] | state[2 * x + 1] for x in range(9)
-        ]
         finished = state[18] | state[19]
 
-        actions = [
-            (R, C, r, c)
-            for R in Rset
-            for C in Cset
-            for r in range(3)
-            for c in range(3)
-            if not occupied[3 * R + C] & positions[(r, c)]
-            and not finished & positions[(R, C)]
-        ]
+        if state[20] is None:
+            actions = []
+            for k in range(9):
+                if not finished >> k & 1:
+                    free = ~(state[2 * k] | state[2 * k + 1]) & 0x1ff
+                    actions.extend(cell_actions_table[k][free])
+            return actions
+
+        k = 3 * state[20] + state[21]
+        if finished >> k & 1:
+            return []
+        return list(cell_actions_table[k][~(state[2 * k] | state[2 * k + 1]) & 0x1ff])
+
+    def random_legal_action(self, state, rng=random):
+        """ Returns a uniformly random legal action without building the legal_actions list.
+
+        Draws the same random number as rng.choice(self.legal_actions(state)) would, so both pick the same
+        action for the same generator state.
+        """
+        finished = state[18] | state[19]
 
-        return actions
+        if state[20] is not None:
+            k = 3 * state[20] + state[21]
+            return rng.choice(cell_actions_table[k][~(state[2 * k] | state[2 * k + 1]) & 0x1ff])
+
+        total = 0
+        for k in range(9):
+            if not finished >> k & 1:
+                total += popcount_table[~(state[2 * k] | state[2 * k + 1]) & 0x1ff]
+
+        n = rng.randrange(total)
+        for k in range(9):
+            if not finished >> k & 1:
+                cells = cell_actions_table[k][~(state[2 * k] | state[2 * k + 1]) & 0x1ff]
+                if n < len(cells):
+                    return cells[n]
+                n -= len(cells)
+
+    def random_playout(self, state, rng=random, played=None):
+        """ Plays uniformly random moves from state until the game ends and returns the result.
+
+        Runs the whole game in one loop over local bitmasks, only re-checking the big board when a
+        sub-board is decided, and makes the same random draws as repeatedly applying
+        random_legal_action and next_state. The moves are appended to played if it is a list.
+
+        Returns:    The winning player, 1 or 2, or 0 for a draw.
+        """
+        boards = list(state[:18])
+        big1, big2 = state[18], state[19]
+        if win_table[big1 & ~big2]:
+            return 1
+        if win_table[big2 & ~big1]:
+            return 2
+        if full_table[big1 | big2]:
+            return 0
+
+        k = 9 if state[20] is None else 3 * state[20] + state[21]
+        player_index = state[22] - 1
+        choice, randrange = rng.choice, rng.randrange
+
+        while True:
+            if k == 9:
+                finished = big1 | big2
+                total = 0
+                for b in range(9):
+                    if not finished >> b & 1:
+                        total += popcount_table[~(boards[2 * b] | boards[2 * b + 1]) & 0x1ff]
+                n = randrange(total)
+                for b in range(9):
+                    if not finished >> b & 1:
+                        cells = free_cells_table[~(boards[2 * b] | boards[2 * b + 1]) & 0x1ff]
+                        if n < len(cells):
+                            k, cell = b, cells[n]
+                            break
+                        n -= len(cells)
+            else:
+                cell = choice(free_cells_table[~(boards[2 * k] | boards[2 * k + 1]) & 0x1ff])
+
+            slot = 2 * k + player_index
+            boards[slot] |= 1 << cell
+            if played is not None:
+                played.append(board_cell_actions[9 * k + cell])
+
+            if win_table[boards[slot]]:
+                if player_index:
+                    big2 |= 1 << k
+                    if win_table[big2 & ~big1]:
+                        return 2
+                else:
+                    big1 |= 1 << k
+                    if win_table[big1 & ~big2]:
+                        return 1
+                if full_table[big1 | big2]:
+                    return 0
+            elif full_table[boards[2 * k] | boards[2 * k + 1]]:
+                big1 |= 1 << k
+                big2 |= 1 << k
+                if full_table[big1 | big2]:
+                    return 0
+
+            k = 9 if (big1 | big2) >> cell & 1 else cell
+            player_index ^= 1
 
     def previous_player(self, state):
         return 3 - state[-1]
@@ -267,18 +383,48 @@ class Board(object):
     def current_player(self, state):
         return state[-1]
 
-    def is_ended(self, state):
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
+    def winning_cells(self, state, player, k):
+        """ Returns the 9-bit mask of the free cells of board k that complete a line for player (1 or 2). """
+        return winning_cells(state, player, k)
 
-        if any(w & p1 == w for w in self.wins):
-            return True
-        if any(w & p2 == w for w in self.wins):
-            return True
-        if state[18] | state[19] == 0x1ff:
-            return True
+    def threat_boards(self, state, player):
+        """ Returns the 9-bit mask of the undecided boards where player (1 or 2) can win in one move. """
+        return threat_boards(state, player)
+
+    def threat_cells(self, state, player):
+        """ Returns the winning cells of player on all undecided boards as an 81-bit mask, with bit
+        9 * (3 * R + C) + (3 * r + c) per cell. """
+        return threat_cells(state, player)
+
+    def transform_state(self, state, transform):
+        """ Returns state with symmetry transform (0-7, see cell_permutations) applied to every board. """
+        return transform_state(state, transform)
+
+    def transform_action(self, action, transform):
+        """ Returns the action that corresponds to action in the state transformed by transform. """
+        return transform_action(action, transform)
+
+    def canonical_state(self, state):
+        """ Returns the canonical form of state among its 8 symmetric forms and the transform that gives it. """
+        return canonical_state(state)
+
+    def canonical_hash(self, state):
+        """ Returns the Zobrist hash of the canonical form of state, the same for all symmetric states. """
+        return self.zobrist_hash(canonical_state(state)[0])
 
-        return False
+    def unique_actions(self, state):
+        """ Returns the legal actions of state, keeping one of each set of actions that symmetries of state
+        make equivalent. """
+        return unique_actions(state, self.legal_actions(state))
+
+    def move_count(self, state):
+        """ Returns the number of moves played to reach state. """
+        return sum(popcount_table[mask] for mask in state[:18])
+
+    def is_ended(self, state):
+        return (win_table[state[18] & ~state[19]] or
+                win_table[state[19] & ~state[18]] or
+                full_table[state[18] | state[19]])
 
     def win_values(self, state):
         if not self.is_ended(state):
@@ -286,11 +432,11 @@ class Board(object):
         p1 = state[18] & ~state[19]
         p2 = state[19] & ~state[18]
 
-        if any(w & p1 == w for w in self.wins):
+        if win_table[p1]:
             return {1: 1, 2: 0}
-        if any(w & p2 == w for w in self.wins):
+        if win_table[p2]:
             return {1: 0, 2: 1}
-        if state[18] | state[19] == 0x1ff:
+        if full_table[state[18] | state[19]]:
             return {1: 0.5, 2: 0.5}
 
     def owned_boxes(self, state):
@@ -313,11 +459,11 @@ class Board(object):
         p1 = state[18] & ~state[19]
         p2 = state[19] & ~state[18]
 
-        if any(w & p1 == w for w in self.wins):
+        if win_table[p1]:
             return {1: 1, 2: -1}
-        if any(w & p2 == w for w in self.wins):
+        if win_table[p2]:
             return {1: -1, 2: 1}
-        if state[18] | state[19] == 0x1ff:
+        if full_table[state[18] | state[19]]:
             return {1: 0, 2: 0}
 
     def winner_message(self, winners):
@@ -326,3 +472,151 @@ class Board(object):
         if value == 0.5:
             return "Draw."
         return "Winner: Player {0}.".format(winner)
+
+
+def _completions(mask):
+    cells = 0
+    for w in Board.wins:
+        if bin(mask & w).count('1') == 2:
+            cells |= w & ~mask
+    return cells
+
+# Lookup tables indexed by a 9-bit sub-board (or big-board) mask, so the hot
+# paths answer "is this a win", "which cells complete a line" and "is this
+# full" with a single list index instead of scanning Board.wins.
+win_table = [any(mask & w == w for w in Board.wins) for mask in range(0x200)]
+completion_table = [_completions(mask) for mask in range(0x200)]
+full_table = [mask == 0x1ff for mask in range(0x200)]
+popcount_table = [bin(mask).count('1') for mask in range(0x200)]
+free_cells_table = [tuple(i for i in range(9) if mask >> i & 1) for mask in range(0x200)]
+
+# board_cell_actions[9 * k + i] is the action playing cell i of board k.
+board_cell_actions = [(k // 3, k % 3, i // 3, i % 3) for k in range(9) for i in range(9)]
+
+# cell_actions_table[k][mask] is the tuple of actions, in legal_actions order, for the cells set in mask
+# within board k = 3 * R + C.
+cell_actions_table = [
+    [
+        tuple((k // 3, k % 3, i // 3, i % 3) for i in range(9) if mask >> i & 1)
+        for mask in range(0x200)
+    ]
+    for k in range(9)
+]
+
+# Threats. A board's winning cells for a player are the free cells that complete one of its lines, which
+# completion_table gives for the player's mask; decided boards have none. These work on anything indexable
+# like a tuple state, including MutableBoard.
+
+def winning_cells(state, player, k):
+    if (state[18] | state[19]) >> k & 1:
+        return 0
+    own = state[2 * k + player - 1]
+    return completion_table[own] & ~(own | state[2 * k + 2 - player]) & 0x1ff
+
+
+def threat_boards(state, player):
+    boards = 0
+    for k in range(9):
+        own = state[2 * k + player - 1]
+        if completion_table[own] & ~(own | state[2 * k + 2 - player]):
+            boards |= 1 << k
+    return boards & ~(state[18] | state[19])
+
+
+def threat_cells(state, player):
+    cells = 0
+    for k in range(9):
+        own = state[2 * k + player - 1]
+        cells |= (completion_table[own] & ~(own | state[2 * k + 2 - player]) & 0x1ff) << (9 * k)
+    for k in free_cells_table[state[18] | state[19]]:
+        cells &= ~(0x1ff << (9 * k))
+    return cells
+
+# Symmetries. The 8 rotations and reflections of the square act on the big board and every sub-board at
+# once: transform t moves cell i of each board to cell_permutations[t][i], and board k to the same place.
+# Sending the opponent to the board of the cell just played commutes with this, so a transformed game is
+# played with the transformed actions. permutation_table[t][mask] is a 9-bit mask with its bits moved by t.
+
+_cell_transforms = (
+    lambda r, c: (r, c),            # identity
+    lambda r, c: (c, 2 - r),        # rotation by 90 degrees
+    lambda r, c: (2 - r, 2 - c),    # rotation by 180 degrees
+    lambda r, c: (2 - c, r),        # rotation by 270 degrees
+    lambda r, c: (r, 2 - c),        # reflection across the middle column
+    lambda r, c: (c, r),            # reflection across the main diagonal
+    lambda r, c: (2 - r, c),        # reflection across the middle row
+    lambda r, c: (2 - c, 2 - r),    # reflection across the anti-diagonal
+)
+cell_permutations = [
+    tuple(3 * transform(i // 3, i % 3)[0] + transform(i // 3, i % 3)[1] for i in range(9))
+    for transform in _cell_transforms
+]
+inverse_transforms = [
+    next(u for u in range(8) if all(cell_permutations[u][cell_permutations[t][i]] == i for i in range(9)))
+    for t in range(8)
+]
+permutation_table = [
+    [sum(1 << permutation[i] for i in range(9) if mask >> i & 1) for mask in range(0x200)]
+    for permutation in cell_permutations
+]
+
+
+def transform_state(state, transform):
+    permutation = cell_permutations[transform]
+    masks = permutation_table[transform]
+    new_state = [0] * 23
+    for k in range(9):
+        new_k = permutation[k]
+        new_state[2 * new_k] = masks[state[2 * k]]
+        new_state[2 * new_k + 1] = masks[state[2 * k + 1]]
+    new_state[18] = masks[state[18]]
+    new_state[19] = masks[state[19]]
+    if state[20] is None:
+        new_state[20] = new_state[21] = None
+    else:
+        new_state[20], new_state[21] = divmod(permutation[3 * state[20] + state[21]], 3)
+    new_state[22] = state[22]
+    return tuple(new_state)
+
+
+def transform_action(action, transform):
+    permutation = cell_permutations[transform]
+    R, C, r, c = action
+    return divmod(permutation[3 * R + C], 3) + divmod(permutation[3 * r + c], 3)
+
+
+def canonical_state(state):
+    """ The smallest of the 8 symmetric forms of state as a tuple, and the transform giving it. Map actions
+    of the canonical state back with transform_action(action, inverse_transforms[transform]). """
+    state = tuple(state)
+    best, best_transform = state, 0
+    for transform in range(1, 8):
+        candidate = transform_state(state, transform)
+        if candidate < best:
+            best, best_transform = candidate, transform
+    return best, best_transform
+
+
+def unique_actions(state, actions):
+    """ Keeps the first of actions in each set that a symmetry leaving state unchanged maps onto each other. """
+    state = tuple(state)
+    stabilizer = [t for t in range(1, 8) if transform_state(state, t) == state]
+    if not stabilizer:
+        return actions
+    kept = []
+    seen = set()
+    for action in actions:
+        if action not in seen:
+            kept.append(action)
+            seen.add(action)
+            seen.update(transform_action(action, t) for t in stabilizer)
+    return kept
+
+# Zobrist keys, from a fixed seed so hashes agree between processes and runs: one per (player, board, cell),
+# one per (player, decided big-board cell), one per required board (9 meaning unconstrained) and one for
+# player 2 to move.
+_zobrist_random = random.Random(0x7a6b7269)
+zobrist_cells = [[[_zobrist_random.getrandbits(64) for cell in range(9)] for k in range(9)] for player in range(2)]
+zobrist_big = [[_zobrist_random.getrandbits(64) for k in range(9)] for player in range(2)]
+zobrist_constraint = [_zobrist_random.getrandbits(64) for k in range(10)]
+zobrist_player = _zobrist_random.getrandbits(64)
@@ -0,0 +1,185 @@
+import random
+from p2_t3 import Board, win_table, full_table, popcount_table, cell_actions_table
+
+UNCONSTRAINED = 9
+
+
+class MutableBoard(object):
+    """ A single game position that is played forward with push() and taken back with pop().
+
+    The fields mirror p2_t3.Board's tuple states: boards[0..17] are the per-player sub-board masks and
+    boards[18..19] the big-board masks. Indexing a MutableBoard (board[i]) reads it exactly like the
+    equivalent tuple state, so helpers written against tuple states work on it unchanged.
+
+    Every push() records a single int on the undo stack, so search and rollouts can walk up and down
+    the game tree without building a new state per ply.
+    """
+    __slots__ = ('boards', 'constraint', 'player', 'history')
+
+    def __init__(self, state=None):
+        if state is None:
+            state = Board().starting_state()
+        self.load(state)
+
+    def load(self, state):
+        """ Resets the board to the given p2_t3.Board tuple state and clears the undo stack. """
+        self.boards = list(state[:20])
+        if state[20] is None:
+            self.constraint = UNCONSTRAINED
+        else:
+            self.constraint = 3 * state[20] + state[21]
+        self.player = state[22]
+        self.history = []
+
+    def state(self):
+        """ Returns the current position as a p2_t3.Board tuple state. """
+        return tuple(self.boards) + (self[20], self[21], self.player)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += 23
+        if index < 20:
+            return self.boards[index]
+        if index == 22:
+            return self.player
+        if self.constraint == UNCONSTRAINED:
+            return None
+        return divmod(self.constraint, 3)[index - 20]
+
+    def __len__(self):
+        return 23
+
+    def ply(self):
+        """ Returns the number of moves that can currently be taken back. """
+        return len(self.history)
+
+    def push(self, action):
+        R, C, r, c = action
+        k = 3 * R + C
+        cell = 3 * r + c
+        boards = self.boards
+        player_index = self.player - 1
+        slot = 2 * k + player_index
+        big = 1 << k
+
+        # Only record bits that this move actually sets, so pop() is exact.
+        added = (1 << cell) & ~boards[slot]
+        boards[slot] |= added
+
+        won = tied = 0
+        if win_table[boards[slot]]:
+            won = big & ~boards[18 + player_index]
+            boards[18 + player_index] |= won
+        elif full_table[boards[2 * k] | boards[2 * k + 1]]:
+            tied = big & ~(boards[18] & boards[19])
+            boards[18] |= tied
+            boards[19] |= tied
+
+        self.history.append(slot | added << 5 | won << 14 | tied << 23 | self.constraint << 32)
+
+        if (boards[18] | boards[19]) >> cell & 1:
+            self.constraint = UNCONSTRAINED
+        else:
+            self.constraint = cell
+        self.player = 3 - self.player
+
+    def pop(self):
+        record = self.history.pop()
+        boards = self.boards
+        slot = record & 0x1f
+        won = (record >> 14) & 0x1ff
+        tied = (record >> 23) & 0x1ff
+
+        boards[slot] &= ~((record >> 5) & 0x1ff)
+        if won:
+            boards[18 + (slot & 1)] &= ~won
+        elif tied:
+            boards[18] &= ~tied
+            boards[19] &= ~tied
+
+        self.constraint = record >> 32
+        self.player = 3 - self.player
+
+    def undo_to(self, ply):
+        """ Pops moves until only ply moves remain on the undo stack. """
+        while len(self.history) > ply:
+            self.pop()
+
+    def is_legal(self, action):
+        R, C, r, c = action
+        if not (0 <= R < 3 and 0 <= C < 3 and 0 <= r < 3 and 0 <= c < 3):
+            return False
+        k = 3 * R + C
+        boards = self.boards
+        if (boards[2 * k] | boards[2 * k + 1]) >> (3 * r + c) & 1:
+            return False
+        if (boards[18] | boards[19]) >> k & 1:
+            return False
+        return self.constraint == UNCONSTRAINED or self.constraint == k
+
+    def legal_actions(self):
+        boards = self.boards
+        finished = boards[18] | boards[19]
+        if self.constraint == UNCONSTRAINED:
+            indices = range(9)
+        else:
+            indices = (self.constraint,)
+
+        actions = []
+        for k in indices:
+            if not finished >> k & 1:
+                actions.extend(cell_actions_table[k][~(boards[2 * k] | boards[2 * k + 1]) & 0x1ff])
+        return actions
+
+    def random_legal_action(self, rng=random):
+        """ Same draw as p2_t3.Board.random_legal_action for the equivalent tuple state. """
+        boards = self.boards
+        k = self.constraint
+        if k != UNCONSTRAINED:
+            return rng.choice(cell_actions_table[k][~(boards[2 * k] | boards[2 * k + 1]) & 0x1ff])
+
+        finished = boards[18] | boards[19]
+        total = 0
+        for k in range(9):
+            if not finished >> k & 1:
+                total += popcount_table[~(boards[2 * k] | boards[2 * k + 1]) & 0x1ff]
+
+        n = rng.randrange(total)
+        for k in range(9):
+            if not finished >> k & 1:
+                cells = cell_actions_table[k][~(boards[2 * k] | boards[2 * k + 1]) & 0x1ff]
+                if n < len(cells):
+                    return cells[n]
+                n -= len(cells)
+
+    def current_player(self):
+        return self.player
+
+    def previous_player(self):
+        return 3 - self.player
+
+    def winner(self):
+        """ Returns 1 or 2 for a won game, 0 for a draw and None while the game is still going. """
+        p1 = self.boards[18] & ~self.boards[19]
+        p2 = self.boards[19] & ~self.boards[18]
+        if win_table[p1]:
+            return 1
+        if win_table[p2]:
+            return 2
+        if full_table[self.boards[18] | self.boards[19]]:
+            return 0
+        return None
+
+    def is_ended(self):
+        boards = self.boards
+        return (win_table[boards[18] & ~boards[19]] or
+                win_table[boards[19] & ~boards[18]] or
+                full_table[boards[18] | boards[19]])
+
+    def points_values(self):
+        winner = self.winner()
+        if winner is None:
+            return
+        if winner == 0:
+            return {1: 0, 2: 0}
+        return {winner: 1, 3 - winner: -1}
@@ -0,0 +1,238 @@
+import random
+import p2_t3
+from p2_t3 import positions, win_table, full_table, popcount_table, cell_actions_table
+from p2_t3 import zobrist_cells, zobrist_big, zobrist_constraint, zobrist_player
+
+# A whole position packed into a single int:
+#   bits   0..80   player 1 cells, bit 9 * (3 * R + C) + (3 * r + c)
+#   bits  81..161  player 2 cells, same layout
+#   bits 162..170  boards won (or tied) by player 1
+#   bits 171..179  boards won (or tied) by player 2
+#   bits 180..183  index of the required board, 9 when unconstrained
+#   bit  184       player to move minus one
+P2_SHIFT = 81
+BIG1_SHIFT = 162
+BIG2_SHIFT = 171
+CONSTRAINT_SHIFT = 180
+PLAYER_SHIFT = 184
+
+UNCONSTRAINED = 9
+
+_tail_mask = ~(0x1f << CONSTRAINT_SHIFT)
+
+
+class PackedBoard(p2_t3.Board):
+    """ Drop-in replacement for p2_t3.Board whose states are plain ints.
+
+    Every method takes and returns packed states; to_tuple/from_tuple convert
+    to and from the 23-element tuple states used by p2_t3.Board, and
+    pack_state/unpack_state speak the same dict format as the original.
+    """
+
+    def starting_state(self):
+        return (UNCONSTRAINED << CONSTRAINT_SHIFT)
+
+    def from_tuple(self, state):
+        packed = 0
+        for k in range(9):
+            packed |= state[2 * k] << (9 * k)
+            packed |= state[2 * k + 1] << (P2_SHIFT + 9 * k)
+        packed |= state[18] << BIG1_SHIFT
+        packed |= state[19] << BIG2_SHIFT
+        if state[20] is None:
+            constraint = UNCONSTRAINED
+        else:
+            constraint = 3 * state[20] + state[21]
+        packed |= constraint << CONSTRAINT_SHIFT
+        packed |= (state[22] - 1) << PLAYER_SHIFT
+        return packed
+
+    def to_tuple(self, state):
+        boards = []
+        for k in range(9):
+            boards.append((state >> (9 * k)) & 0x1ff)
+            boards.append((state >> (P2_SHIFT + 9 * k)) & 0x1ff)
+        boards.append((state >> BIG1_SHIFT) & 0x1ff)
+        boards.append((state >> BIG2_SHIFT) & 0x1ff)
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        if constraint == UNCONSTRAINED:
+            boards.extend((None, None))
+        else:
+            boards.extend((constraint // 3, constraint % 3))
+        boards.append(((state >> PLAYER_SHIFT) & 1) + 1)
+        return tuple(boards)
+
+    def display(self, state, action, _unicode=True):
+        return super().display(self.to_tuple(state), action, _unicode)
+
+    def pack_state(self, data):
+        return self.from_tuple(super().pack_state(data))
+
+    def unpack_state(self, state):
+        return super().unpack_state(self.to_tuple(state))
+
+    def next_state(self, state, action):
+        R, C, r, c = action
+        k = 3 * R + C
+        cell = 3 * r + c
+        player_index = (state >> PLAYER_SHIFT) & 1
+        offset = P2_SHIFT * player_index + 9 * k
+
+        state |= 1 << (offset + cell)
+        if win_table[(state >> offset) & 0x1ff]:
+            state |= 1 << (BIG1_SHIFT + 9 * player_index + k)
+        elif full_table[((state >> (9 * k)) | (state >> (P2_SHIFT + 9 * k))) & 0x1ff]:
+            state |= (1 << (BIG1_SHIFT + k)) | (1 << (BIG2_SHIFT + k))
+
+        finished = (state >> BIG1_SHIFT) | (state >> BIG2_SHIFT)
+        constraint = UNCONSTRAINED if finished >> cell & 1 else cell
+
+        return ((state & _tail_mask) |
+                (constraint << CONSTRAINT_SHIFT) |
+                ((1 - player_index) << PLAYER_SHIFT))
+
+    def is_legal(self, state, action):
+        R, C, r, c = action
+
+        # Is action out of bounds?
+        if (R, C) not in positions:
+            return False
+        if (r, c) not in positions:
+            return False
+
+        k = 3 * R + C
+        cell = 3 * r + c
+
+        # Is the square within the sub-board already taken?
+        if ((state >> (9 * k)) | (state >> (P2_SHIFT + 9 * k))) >> cell & 1:
+            return False
+
+        # Is this particular board won already?
+        if ((state >> BIG1_SHIFT) | (state >> BIG2_SHIFT)) >> k & 1:
+            return False
+
+        # Is our action unconstrained by the previous action?
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        return constraint == UNCONSTRAINED or constraint == k
+
+    def _free_cells(self, state, k):
+        return ~((state >> (9 * k)) | (state >> (P2_SHIFT + 9 * k))) & 0x1ff
+
+    def legal_actions(self, state):
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        boards = range(9) if constraint == UNCONSTRAINED else (constraint,)
+        finished = (state >> BIG1_SHIFT) | (state >> BIG2_SHIFT)
+
+        actions = []
+        for k in boards:
+            if not finished >> k & 1:
+                actions.extend(cell_actions_table[k][self._free_cells(state, k)])
+        return actions
+
+    def random_legal_action(self, state, rng=random):
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        if constraint != UNCONSTRAINED:
+            return rng.choice(cell_actions_table[constraint][self._free_cells(state, constraint)])
+
+        finished = (state >> BIG1_SHIFT) | (state >> BIG2_SHIFT)
+        n = rng.randrange(sum(popcount_table[self._free_cells(state, k)]
+                              for k in range(9) if not finished >> k & 1))
+        for k in range(9):
+            if not finished >> k & 1:
+                cells = cell_actions_table[k][self._free_cells(state, k)]
+                if n < len(cells):
+                    return cells[n]
+                n -= len(cells)
+
+    def random_playout(self, state, rng=random, played=None):
+        return super().random_playout(self.to_tuple(state), rng, played)
+
+    def zobrist_hash(self, state):
+        return super().zobrist_hash(self.to_tuple(state))
+
+    def next_state_hashed(self, state, key, action):
+        R, C, r, c = action
+        k = 3 * R + C
+        new_state = self.next_state(state, action)
+
+        key ^= zobrist_cells[(state >> PLAYER_SHIFT) & 1][k][3 * r + c] ^ zobrist_player
+        changed = new_state ^ state
+        if changed >> (BIG1_SHIFT + k) & 1:
+            key ^= zobrist_big[0][k]
+        if changed >> (BIG2_SHIFT + k) & 1:
+            key ^= zobrist_big[1][k]
+        key ^= (zobrist_constraint[(state >> CONSTRAINT_SHIFT) & 0xf] ^
+                zobrist_constraint[(new_state >> CONSTRAINT_SHIFT) & 0xf])
+
+        return new_state, key
+
+    def previous_player(self, state):
+        return 2 - ((state >> PLAYER_SHIFT) & 1)
+
+    def current_player(self, state):
+        return ((state >> PLAYER_SHIFT) & 1) + 1
+
+    def winning_cells(self, state, player, k):
+        return super().winning_cells(self.to_tuple(state), player, k)
+
+    def threat_boards(self, state, player):
+        return super().threat_boards(self.to_tuple(state), player)
+
+    def threat_cells(self, state, player):
+        return super().threat_cells(self.to_tuple(state), player)
+
+    def transform_state(self, state, transform):
+        return self.from_tuple(p2_t3.transform_state(self.to_tuple(state), transform))
+
+    def canonical_state(self, state):
+        canonical, transform = p2_t3.canonical_state(self.to_tuple(state))
+        return self.from_tuple(canonical), transform
+
+    def canonical_hash(self, state):
+        return super().zobrist_hash(p2_t3.canonical_state(self.to_tuple(state))[0])
+
+    def unique_actions(self, state):
+        return p2_t3.unique_actions(self.to_tuple(state), self.legal_actions(state))
+
+    def move_count(self, state):
+        return bin(state & ((1 << BIG1_SHIFT) - 1)).count('1')
+
+    def _big_boards(self, state):
+        big1 = (state >> BIG1_SHIFT) & 0x1ff
+        big2 = (state >> BIG2_SHIFT) & 0x1ff
+        return big1 & ~big2, big2 & ~big1, big1 | big2
+
+    def is_ended(self, state):
+        p1, p2, finished = self._big_boards(state)
+        return win_table[p1] or win_table[p2] or full_table[finished]
+
+    def win_values(self, state):
+        p1, p2, finished = self._big_boards(state)
+        if win_table[p1]:
+            return {1: 1, 2: 0}
+        if win_table[p2]:
+            return {1: 0, 2: 1}
+        if full_table[finished]:
+            return {1: 0.5, 2: 0.5}
+
+    def points_values(self, state):
+        p1, p2, finished = self._big_boards(state)
+        if win_table[p1]:
+            return {1: 1, 2: -1}
+        if win_table[p2]:
+            return {1: -1, 2: 1}
+        if full_table[finished]:
+            return {1: 0, 2: 0}
+
+    def owned_boxes(self, state):
+        p1, p2, _ = self._big_boards(state)
+        ret = {}
+        for y in range(3):
+            for x in range(3):
+                if p1 & positions[(y, x)]:
+                    ret[(y, x)] = 1
+                elif p2 & positions[(y, x)]:
+                    ret[(y, x)] = 2
+                else:
+                    ret[(y, x)] = 0
+        return ret
@@ -0,0 +1,105 @@
+""" Root-parallel MCTS: independent trees searched in a persistent process pool and merged at the root.
+
+Every worker runs the bot module's own search() from the same state with its own random seed, and sends
+back only the root children's win/visit counts. The counts are summed into a fresh root node so the bot's
+get_best_action can pick the move as usual.
+"""
+import atexit
+import importlib
+import random
+from concurrent.futures import ProcessPoolExecutor
+from mcts_node import MCTSNode
+from search_stats import SearchStats
+
+_pool = None
+_pool_workers = 0
+
+
+def get_pool(workers: int):
+    """ Returns the shared process pool, (re)creating it only when the worker count changes. """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+atexit.register(shutdown_pool)
+
+
+def module_settings(module):
+    """ Returns the module-level tunables (num_nodes, explore_faction, mode flags, ...) of a bot module.
+
+    Workers apply these before searching, so settings changed at runtime in the parent reach them too.
+    """
+    return dict(
+        (name, value) for name, value in vars(module).items()
+        if not name.startswith('_') and isinstance(value, (bool, int, float, str, type(None)))
+    )
+
+
+def _search_worker(module_name, settings, board, state, iterations, time_budget, max_nodes, seed):
+    module = importlib.import_module(module_name)
+    for name, value in settings.items():
+        setattr(module, name, value)
+    random.seed(seed)
+
+    stats = SearchStats()
+    root_node = module.search(board, state, iterations, time_budget=time_budget, max_nodes=max_nodes, stats=stats)
+    return root_node.visits, dict(
+        (action, (child.wins, child.visits, child.proven)) for action, child in root_node.child_nodes.items()
+    ), stats
+
+
+def root_parallel_search(module, board, state, workers: int, iterations: int|None,
+                         time_budget: float|None = None, max_nodes: int|None = None):
+    """ Searches state with one independent tree per worker and merges their root statistics.
+
+    Args:
+        module:     The bot module providing search(board, state, iterations).
+        board:      The game setup.
+        state:      The state to search from.
+        workers:    The number of trees to grow in parallel.
+        iterations: The number of MCTS iterations each tree runs, or None for no cap.
+        time_budget:    Seconds each tree may search for, or None for no limit.
+        max_nodes:  The maximum size of each tree, or None for no limit.
+
+    Returns:
+        root_node: A root MCTSNode whose children hold the summed wins and visits of all trees.
+        stats: The SearchStats of all trees combined.
+
+    """
+    # Seeds come from the caller's random state, so a seeded game replays the same way.
+    seeds = [random.getrandbits(64) for _ in range(workers)]
+    settings = module_settings(module)
+    pool = get_pool(workers)
+    futures = [
+        pool.submit(_search_worker, module.__name__, settings, board, state, iterations, time_budget, max_nodes, seed)
+        for seed in seeds
+    ]
+
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
+    stats = SearchStats()
+    for future in futures:
+        visits, children, worker_stats = future.result()
+        stats.merge(worker_stats)
+        root_node.visits += visits
+        for action, (wins, child_visits, proven) in children.items():
+            child = root_node.child_nodes.get(action)
+            if child is None:
+                child = MCTSNode(parent=root_node, parent_action=action, action_list=[])
+                root_node.child_nodes[action] = child
+            child.wins += wins
+            child.visits += child_visits
+            if proven is not None:
+                child.proven = proven   # a proof holds whichever tree found it
+
+    return root_node, stats
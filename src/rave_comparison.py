@@ -0,0 +1,91 @@
+""" Measures how many MCTS iterations a bot needs with RAVE (use_rave) to match itself without it.
+
+For each fraction f, the bot with RAVE at f * --baseline-nodes iterations per move plays a seeded match
+(tournament.py, the runner behind p2_sim) against the same bot without RAVE at --baseline-nodes. The table
+shows the RAVE side's score, its Elo difference with a 95% confidence interval and the seconds per move of
+each side. The bot "matches" the baseline at the smallest budget whose score reaches 50%.
+
+Usage:
+    python rave_comparison.py [mcts_vanilla|mcts_modified] [--baseline-nodes N] [--fractions F ...]
+                              [--rave-equivalence K] [--rounds N] [--workers W] [--seed S]
+"""
+import argparse
+import statistics
+import elo
+import tournament
+
+
+def compare(bot: str, baseline_nodes: int, fractions, rave_equivalence: float, rounds: int, workers: int,
+            seed: int, log=print):
+    """ Plays one match per fraction and returns their rows.
+
+    Args:
+        bot:            The bot module name.
+        baseline_nodes: Iterations per move of the side without RAVE.
+        fractions:      The RAVE side's iterations per move, as fractions of baseline_nodes.
+        rave_equivalence:   The RAVE side's rave_equivalence.
+        rounds:         Games per match.
+        workers:        Processes to play each match in.
+        seed:           The tournament seed, the same for every match.
+        log:            Called with each row as it is finished, or None.
+
+    Returns:    A list of dicts with the budgets, the match result, the Elo estimate and seconds per move.
+
+    """
+    rows = []
+    for fraction in fractions:
+        nodes = max(1, round(fraction * baseline_nodes))
+        settings = ({'use_rave': True, 'rave_equivalence': rave_equivalence, 'num_nodes': nodes},
+                    {'use_rave': False, 'num_nodes': baseline_nodes})
+        results = list(tournament.run_tournament((bot, bot), rounds, seed, workers, settings))
+        summary = tournament.summarize(results)
+        rating, low, high = elo.elo_interval(summary['a'], summary['b'], summary['draw'])
+        row = {
+            'rave_nodes': nodes,
+            'baseline_nodes': baseline_nodes,
+            'wins': summary['a'],
+            'losses': summary['b'],
+            'draws': summary['draw'],
+            'score': (summary['a'] + 0.5 * summary['draw']) / max(summary['games'], 1),
+            'elo': rating,
+            'elo_low': low,
+            'elo_high': high,
+            'rave_time_per_move': statistics.mean(result['time_per_move'][0] for result in results),
+            'baseline_time_per_move': statistics.mean(result['time_per_move'][1] for result in results),
+        }
+        rows.append(row)
+        if log:
+            log(format_row(row))
+    return rows
+
+
+def format_row(row):
+    return "%10d %10d %4d-%d-%d %6.1f%% %7.1f (%.1f to %.1f) %9.4fs %9.4fs" % (
+        row['rave_nodes'], row['baseline_nodes'], row['wins'], row['losses'], row['draws'], 100 * row['score'],
+        row['elo'], row['elo_low'], row['elo_high'], row['rave_time_per_move'], row['baseline_time_per_move'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Finds the iterations RAVE needs to match the baseline bot.")
+    parser.add_argument('bot', nargs='?', choices=('mcts_vanilla', 'mcts_modified'), default='mcts_vanilla')
+    parser.add_argument('--baseline-nodes', type=int, default=1000, help="iterations per move without RAVE")
+    parser.add_argument('--fractions', type=float, nargs='+', default=[0.25, 0.5, 1.0],
+                        help="iterations per move with RAVE, as fractions of --baseline-nodes")
+    parser.add_argument('--rave-equivalence', type=float, default=300)
+    parser.add_argument('--rounds', type=int, default=100, help="games per match")
+    parser.add_argument('--workers', type=int, default=1, help="processes to play games in")
+    parser.add_argument('--seed', type=int, default=0, help="tournament seed")
+    args = parser.parse_args()
+
+    print("%10s %10s %10s %7s %s %10s %10s" % ("RAVE nodes", "base nodes", "W-L-D", "score", "Elo (95% CI)",
+                                               "RAVE s/mv", "base s/mv"))
+    rows = compare(args.bot, args.baseline_nodes, args.fractions, args.rave_equivalence, args.rounds,
+                   args.workers, args.seed)
+
+    matching = [row for row in rows if row['score'] >= 0.5]
+    if matching:
+        best = min(matching, key=lambda row: row['rave_nodes'])
+        print("%s with RAVE matches the baseline's win rate from %d iterations per move (%.0f%% of %d)"
+              % (args.bot, best['rave_nodes'], 100 * best['rave_nodes'] / args.baseline_nodes, args.baseline_nodes))
+    else:
+        print("%s with RAVE did not match the baseline's win rate at any budget tried" % args.bot)
@@ -0,0 +1,60 @@
+""" Compares random playout throughput of the old recursive rollout, mcts_vanilla.rollout and Board.random_playout.
+
+Usage: python rollout_benchmark.py [playouts]
+"""
+import sys
+import random
+from random import choice
+from timeit import default_timer as time
+import p2_t3
+import mcts_vanilla
+
+board = p2_t3.Board()
+
+
+def recursive_rollout(board, state):
+    # The recursive rollout mcts_vanilla used to run, kept here as the reference point.
+    if not board.is_ended(state):
+        return recursive_rollout(board, board.next_state(state, choice(board.legal_actions(state))))
+    return state
+
+
+def starting_positions(count, seed=0):
+    """ Returns count seeded positions reached by 0-30 random moves from the start. """
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        state = board.starting_state()
+        for _ in range(rng.randrange(31)):
+            if board.is_ended(state):
+                break
+            state = board.next_state(state, board.random_legal_action(state, rng))
+        if not board.is_ended(state):
+            states.append(state)
+    return states
+
+
+def measure(name, playout, states):
+    random.seed(1)
+    start = time()
+    wins = 0
+    for state in states:
+        wins += playout(state)
+    elapsed = time() - start
+    print("%-28s %8.0f playouts/sec  (%d player-1 wins)" % (name, len(states) / elapsed, wins))
+    return len(states) / elapsed
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    states = starting_positions(count)
+
+    baseline = measure("recursive rollout + is_win",
+                       lambda s: mcts_vanilla.is_win(board, recursive_rollout(board, s), 1), states)
+    iterative = measure("mcts_vanilla.rollout + is_win",
+                        lambda s: mcts_vanilla.is_win(board, mcts_vanilla.rollout(board, s), 1), states)
+    fast = measure("Board.random_playout",
+                   lambda s: board.random_playout(s) == 1, states)
+
+    print("speedup over recursive rollout: %.2fx (rollout), %.2fx (random_playout)"
+          % (iterative / baseline, fast / baseline))
@@ -44,7 +44,7 @@ def think(board, state):
             for i in range(MAX_DEPTH):
                 if board.is_ended(rollout_state):
                     break
-                rollout_move = random.choice(board.legal_actions(rollout_state))
+                rollout_move = board.random_legal_action(rollout_state)
                 rollout_state = board.next_state(rollout_state, rollout_move)
 
             total_score += outcome(board.owned_boxes(rollout_state),
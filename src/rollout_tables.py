@@ -0,0 +1,138 @@
+""" Lookup tables for mcts_modified's heuristic rollout move.
+
+heuristic_action scores the cells of one sub-board (heuristic_values) from that sub-board's cells and the
+bot's identity alone, then takes 10 off every empty cell whose own sub-board is undecided and lets the
+opponent complete a line in one move (dangerous_boards), which depends only on that sub-board's cells. Both
+are tabulated here, the scores for every local position (3^9 per identity) by running the reference function
+and the threats for every pair of masks from completion_table, so a rollout move costs a few lookups:
+
+    value_table[bot_identity - 1][p1 | p2 << 9]    -> ((cell, value), ...) for the empty cells, in cell order
+    threat_table[bot_identity - 1][p1 | p2 << 9]   -> 1 where the opponent of bot_identity can win at once
+
+Building takes a couple of seconds, so the tables are pickled next to this file and reused while the
+reference function and build() are unchanged.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+from p2_t3 import popcount_table, completion_table
+
+cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rollout_tables.pickle')
+
+value_table = None
+threat_table = None
+
+
+def local_positions():
+    """ Yields the (p1, p2) masks of every sub-board position, cells owned by one player at most. """
+    for index in range(3 ** 9):
+        p1 = p2 = 0
+        for cell in range(9):
+            index, owner = divmod(index, 3)
+            if owner == 1:
+                p1 |= 1 << cell
+            elif owner == 2:
+                p2 |= 1 << cell
+        yield p1, p2
+
+
+def synthetic_state(p1, p2, player):
+    """ A tuple state with (p1, p2) on sub-board (0, 0) and everything else empty. """
+    return (p1, p2) + (0,) * 18 + (None, None, player)
+
+
+def build(heuristic_values):
+    """ Runs the reference function on every local position and returns (value_table, threat_table). """
+    values = ([None] * (1 << 18), [None] * (1 << 18))
+    for p1, p2 in local_positions():
+        key = p1 | p2 << 9
+        for bot_identity in (1, 2):
+            state = synthetic_state(p1, p2, bot_identity)
+            grid, valueGrid = heuristic_values(state, (0, 0), bot_identity)
+            values[bot_identity - 1][key] = tuple(
+                (3 * r + c, valueGrid[(r, c)]) for r in range(3) for c in range(3) if grid[(r, c)] == 0
+            )
+
+    # Playing the center whenever more than 9 moves are legal can take a cell the opponent already owns, and
+    # the reference then counts the cell as player 1's. Give overlapping masks the entry of that position.
+    for key in range(1 << 18):
+        p1, p2 = key & 0x1ff, key >> 9
+        if p1 & p2:
+            owned = p1 | (p2 & ~p1) << 9
+            for table in values:
+                table[key] = table[owned]
+
+    # Built on the raw masks, overlapping ones included, exactly as p2_t3.threat_boards reads them
+    threats = (bytearray(1 << 18), bytearray(1 << 18))
+    for key in range(1 << 18):
+        p1, p2 = key & 0x1ff, key >> 9
+        free = ~(p1 | p2)
+        threats[0][key] = 1 if completion_table[p2] & free else 0    # bot 1, so player 2 threatens
+        threats[1][key] = 1 if completion_table[p1] & free else 0
+    return values, (bytes(threats[0]), bytes(threats[1]))
+
+
+def load(heuristic_values):
+    """ Fills value_table and threat_table, from the cache file when it matches the reference source. """
+    global value_table, threat_table
+    if value_table is not None:
+        return
+    source = inspect.getsource(heuristic_values) + inspect.getsource(build)
+    version = hashlib.sha1(source.encode()).hexdigest()
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_version, tables = pickle.load(f)
+        if cached_version == version:
+            value_table, threat_table = tables
+            return
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        pass
+
+    value_table, threat_table = build(heuristic_values)
+    try:
+        # Write then rename, so processes building at the same time never read a partial file
+        temp_path = '%s.%d' % (cache_path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            pickle.dump((version, (value_table, threat_table)), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass    # a read-only checkout just rebuilds the tables each time
+
+
+def rollout_action(state, bot_identity):
+    """ Returns the move the heuristic rollout plays for bot_identity in state: the center (1, 1, 1, 1) when
+    more than 9 moves are legal, else the same move as heuristic_action.
+
+    Args:
+        state:          A p2_t3.Board tuple state, or anything indexable like one (a MutableBoard).
+        bot_identity:   The bot's identity, either 1 or 2
+
+    """
+    finished = state[18] | state[19]
+    if state[20] is None:
+        count = 0
+        first = None
+        for k in range(9):
+            if not finished >> k & 1:
+                free = popcount_table[~(state[2 * k] | state[2 * k + 1]) & 0x1ff]
+                if free and first is None:
+                    first = k
+                count += free
+        if count > 9:
+            return 1, 1, 1, 1
+        k = first
+    else:
+        k = 3 * state[20] + state[21]
+
+    threats = threat_table[bot_identity - 1]
+    best = 0
+    best_value = -1000
+    for cell, value in value_table[bot_identity - 1][state[2 * k] | state[2 * k + 1] << 9]:
+        if threats[state[2 * cell] | state[2 * cell + 1] << 9] and not finished >> cell & 1:
+            value -= 10
+        if value > best_value:
+            best = cell
+            best_value = value
+    return k // 3, k % 3, best // 3, best % 3
@@ -0,0 +1,85 @@
+""" Statistics reported by a single MCTS search (one call to a bot's think()). """
+
+
+class SearchStats(object):
+    """ Counters filled in by a bot's search().
+
+    Attributes:
+        iterations:     MCTS iterations completed.
+        elapsed:        Wall-clock seconds spent searching.
+        nodes_created:  Tree nodes added during the search.
+        tree_size:      Nodes in the tree when the search stopped, if known.
+        max_depth:      Deepest node reached by selection/expansion, counted in plies from the root.
+        stop_reason:    'iterations', 'time' or 'nodes', whichever limit ended the search, 'proven' once the
+                        endgame solver proved the root's result, or 'book' for a move from the opening book.
+
+    Filled in only when the bot's profile flag is set:
+        phase_times:    Seconds spent in each search phase, e.g. {'select': ..., 'expand': ..., 'rollout': ...,
+                        'backpropagate': ...}, plus 'solve' for leaves given to the endgame solver. Modes whose
+                        phases are interleaved report 'tree' and 'rollout'.
+        rollouts:       Playouts whose length was measured.
+        rollout_plies:  Moves played in those playouts.
+
+    """
+
+    def __init__(self):
+        self.iterations = 0
+        self.elapsed = 0.
+        self.nodes_created = 0
+        self.tree_size = None
+        self.max_depth = 0
+        self.stop_reason = None
+        self.phase_times = {}
+        self.rollouts = 0
+        self.rollout_plies = 0
+
+    @property
+    def nodes_per_sec(self):
+        """ Iterations per second; every iteration adds at most one node. """
+        return self.iterations / self.elapsed if self.elapsed else 0.
+
+    @property
+    def mean_rollout_length(self):
+        return self.rollout_plies / self.rollouts if self.rollouts else 0.
+
+    def add_time(self, phase, seconds):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.) + seconds
+
+    def merge(self, other):
+        """ Adds the counters of a search run in parallel with this one. """
+        self.iterations += other.iterations
+        self.elapsed = max(self.elapsed, other.elapsed)
+        self.nodes_created += other.nodes_created
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.stop_reason = self.stop_reason or other.stop_reason
+        for phase, seconds in other.phase_times.items():
+            self.add_time(phase, seconds)
+        self.rollouts += other.rollouts
+        self.rollout_plies += other.rollout_plies
+
+    def as_dict(self):
+        """ Returns the statistics as a flat dict, with one '<phase>_time' entry per profiled phase. """
+        values = {
+            'iterations': self.iterations,
+            'elapsed': self.elapsed,
+            'nodes_per_sec': self.nodes_per_sec,
+            'nodes_created': self.nodes_created,
+            'tree_size': self.tree_size,
+            'max_depth': self.max_depth,
+            'stop_reason': self.stop_reason,
+        }
+        if self.rollouts:
+            values['rollouts'] = self.rollouts
+            values['mean_rollout_length'] = self.mean_rollout_length
+        for phase, seconds in self.phase_times.items():
+            values[phase + '_time'] = seconds
+        return values
+
+    def __repr__(self):
+        return ' '.join(["[", "Iterations:", str(self.iterations),
+                         "Time:", "{0:.3f}s".format(self.elapsed),
+                         "Nodes/sec:", "{0:.0f}".format(self.nodes_per_sec),
+                         "Max depth:", str(self.max_depth),
+                         "Stopped by:", str(self.stop_reason)] +
+                        ["%s: %.3fs" % (phase.capitalize(), seconds) for phase, seconds in self.phase_times.items()] +
+                        ["]"])
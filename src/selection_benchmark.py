@@ -0,0 +1,88 @@
+""" Compares mcts_vanilla's iterative selection and backpropagation with the recursive versions it replaced,
+at equal iteration counts from the same positions and seeds.
+
+Both searches use the same expansion and playouts, so with the same seed they must grow the same trees and
+pick the same moves; only the time differs.
+
+Usage: python selection_benchmark.py [iterations] [positions]
+"""
+import sys
+import random
+from math import sqrt, log
+from timeit import default_timer as time
+import p2_t3
+import mcts_vanilla
+from mcts_node import MCTSNode
+from rollout_benchmark import starting_positions
+
+board = p2_t3.Board()
+
+
+def recursive_ucb(node, is_opponent):
+    exploit = node.wins / node.visits
+    if is_opponent:
+        exploit = 1 - exploit
+    return exploit + mcts_vanilla.explore_faction * sqrt(log(node.parent.visits) / node.visits)
+
+
+def recursive_traverse_nodes(node, board, state, bot_identity):
+    # The recursive selection mcts_vanilla used to run, kept here as the reference point.
+    if board.is_ended(state):
+        return node, state
+    if len(node.untried_actions) != len(node.child_nodes):
+        return node, state
+
+    max_node = None
+    max_state = None
+    max_score = 0
+    for action, child in node.child_nodes.items():
+        UCT_score = recursive_ucb(child, board.current_player(state) != bot_identity)
+        if UCT_score > max_score:
+            max_node = child
+            max_state = board.next_state(state, action)
+            max_score = UCT_score
+
+    if max_state is None:
+        return node, state
+    return recursive_traverse_nodes(max_node, board, max_state, board.current_player(max_state))
+
+
+def recursive_backpropagate(node, won):
+    if node.parent is None:
+        node.visits += 1
+        return
+    node.visits += 1
+    if won:
+        node.wins += 1
+    recursive_backpropagate(node.parent, won)
+
+
+def run(traverse, backpropagate, state, iterations, seed):
+    random.seed(seed)
+    bot_identity = board.current_player(state)
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
+    start = time()
+    for _ in range(iterations):
+        node, leaf_state = traverse(root_node, board, state, bot_identity)
+        leaf, leaf_state = mcts_vanilla.expand_leaf(node, board, leaf_state)
+        backpropagate(leaf, board.random_playout(leaf_state) == bot_identity)
+    return time() - start, mcts_vanilla.get_best_action(root_node)
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    states = starting_positions(count)
+
+    totals = [0., 0.]
+    for seed, state in enumerate(states):
+        old, old_action = run(recursive_traverse_nodes, recursive_backpropagate, state, iterations, seed)
+        new, new_action = run(mcts_vanilla.traverse_nodes, mcts_vanilla.backpropagate, state, iterations, seed)
+        assert old_action == new_action, "the two implementations chose different moves"
+        totals[0] += old
+        totals[1] += new
+        print("position %d  recursive %.3fs  iterative %.3fs  move %s" % (seed, old, new, new_action))
+
+    print("%d iterations x %d positions: %.0f vs %.0f iterations/sec, speedup %.2fx"
+          % (iterations, count, iterations * count / totals[0], iterations * count / totals[1],
+             totals[0] / totals[1]))
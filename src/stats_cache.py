@@ -0,0 +1,137 @@
+""" Persistent node statistics shared between searches, games and processes, in an SQLite file.
+
+A search flushes the visits and wins its tree gathered for each well-visited node, keyed by the canonical
+Zobrist hash of the node's state (p2_t3.Board.canonical_hash) and the player the wins are counted for, and
+later searches start new nodes from those counts (capped at prior_visits) instead of from zero. Counts add
+up across searches: each node remembers how much of its statistics the cache already holds
+(MCTSNode.stored_visits and stored_wins), so a tree kept between moves is never counted twice.
+
+The bots warm a new root, and below it only the children of nodes with at least min_visits visits: flushes
+skip nodes below that, so lookups deeper in the tree would almost always miss.
+
+Every process opens its own connection. The database runs in WAL mode, so readers never wait for a writer,
+and each flush is one transaction, retried by SQLite's busy timeout while another process writes. Every
+evict_interval flushes, a connection counts the rows and evicts the least recently used ones past
+max_entries, so the table can overshoot max_entries by that many flushes' worth of rows in between.
+"""
+import os
+import sqlite3
+from timeit import default_timer as time
+
+max_entries = 1000000       # rows kept after eviction
+prior_visits = 100          # the most visits a new node takes from the cache
+min_visits = 20             # nodes with fewer new visits than this are not flushed
+busy_timeout = 30.          # seconds to wait for another process's write
+evict_interval = 64         # flushes between a connection's row counts; counting scans the whole table
+
+_caches = {}                # (path, pid) -> StatsCache, so forked workers open their own connection
+
+
+class StatsCache(object):
+    """ A connection to a statistics file. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.flushes = 0
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            " key INTEGER NOT NULL, player INTEGER NOT NULL, visits INTEGER NOT NULL, wins REAL NOT NULL,"
+            " last_used REAL NOT NULL, PRIMARY KEY (key, player)) WITHOUT ROWID")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS nodes_last_used ON nodes (last_used)")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def lookup(self, key: int, player: int):
+        """ Returns the (visits, wins) stored for a position, wins counted for player, or None. """
+        return self.connection.execute("SELECT visits, wins FROM nodes WHERE key = ? AND player = ?",
+                                       (_signed(key), player)).fetchone()
+
+    def add(self, records):
+        """ Adds (key, player, visits, wins) records to the stored counts in one transaction, and every
+        evict_interval calls evicts the least recently used rows past max_entries. """
+        now = time()
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                "INSERT INTO nodes (key, player, visits, wins, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key, player) DO UPDATE SET visits = visits + excluded.visits,"
+                " wins = wins + excluded.wins, last_used = excluded.last_used",
+                [(_signed(key), player, visits, wins, now) for key, player, visits, wins in records])
+            self.flushes += 1
+            if self.flushes % evict_interval == 0:
+                excess = len(self) - max_entries
+                if excess > 0:
+                    self.connection.execute(
+                        "DELETE FROM nodes WHERE (key, player) IN"
+                        " (SELECT key, player FROM nodes ORDER BY last_used LIMIT ?)", (excess,))
+
+    def close(self):
+        self.connection.close()
+
+
+def _signed(key: int):
+    """ Zobrist keys are unsigned 64-bit; SQLite integers are signed. """
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def open_cache(path: str):
+    """ Returns this process's StatsCache for path, opening it on first use. """
+    cache = _caches.get((path, os.getpid()))
+    if cache is None:
+        cache = _caches[(path, os.getpid())] = StatsCache(path)
+    return cache
+
+
+def warm(cache: StatsCache, node, board, state, player: int):
+    """ Starts a new node from the stored statistics of its state, if there are any.
+
+    Args:
+        cache:  The statistics cache.
+        node:   A node that has just been added to the tree, with no visits yet.
+        board:  The game setup.
+        state:  The tuple state associated with node.
+        player: The player the tree counts wins for.
+
+    """
+    stored = cache.lookup(board.canonical_hash(state), player)
+    if stored is not None and stored[0] > 0:
+        visits, wins = stored
+        if visits > prior_visits:
+            wins = wins * prior_visits / visits
+            visits = prior_visits
+        node.visits = node.stored_visits = visits
+        node.wins = node.stored_wins = wins
+
+
+def flush(cache: StatsCache, root_node, board, root_state, player: int):
+    """ Adds the statistics the tree gathered since its last flush to the cache.
+
+    Args:
+        cache:      The statistics cache.
+        root_node:  The root of the tree.
+        board:      The game setup.
+        root_state: The state associated with root_node.
+        player:     The player the tree counts wins for.
+
+    Returns:    The number of positions written.
+
+    """
+    records = []
+    stack = [(root_node, root_state)]
+    while stack:
+        node, state = stack.pop()
+        new_visits = node.visits - node.stored_visits
+        if new_visits < min_visits:
+            continue    # only the root can get here; children below min_visits are never stacked
+        records.append((board.canonical_hash(state), player, new_visits, node.wins - node.stored_wins))
+        node.stored_visits = node.visits
+        node.stored_wins = node.wins
+        stack.extend((child, board.next_state(state, action)) for action, child in node.child_nodes.items()
+                     if child.visits - child.stored_visits >= min_visits)
+    if records:
+        cache.add(records)
+    return len(records)
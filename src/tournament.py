@@ -0,0 +1,165 @@
+""" Seeded tournaments between two bots, with the games spread over a process pool.
+
+The two entrants are called A and B. A plays first (player 1) in even-numbered games and B in odd-numbered
+ones. Game g is seeded with game_seed(seed, g), and every bot module's new_game() is called before it
+starts, so a game's moves depend only on the tournament seed, its number and the bot settings. The same
+seed therefore gives the same results whatever the number of workers. Time budgets (move_time) are the
+exception, since how far a search gets then depends on the machine.
+"""
+import contextlib
+import importlib
+import io
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from timeit import default_timer as time
+import p2_t3
+
+bot_names = ('random_bot', 'rollout_bot', 'mcts_vanilla', 'mcts_modified')
+
+
+def game_seed(seed: int, game: int):
+    """ Returns the random seed of game number game in a tournament seeded with seed. """
+    return random.Random('%d:%d' % (seed, game)).getrandbits(64)
+
+
+def play_game(game: int, seed: int, entrants, settings, collect_stats: bool = False):
+    """ Plays one game of a tournament.
+
+    Args:
+        game:       The game number; entrant A plays first when it is even.
+        seed:       The random seed of the game.
+        entrants:   The module names of bots A and B.
+        settings:   Two dicts of module attributes (num_nodes, move_time, ...) applied before each move of A and B.
+        collect_stats:  Whether to record the SearchStats of every move of the bots that provide them.
+
+    Returns:
+        A dict with the game number and seed, the bots playing each colour, the winner (1, 2 or 0 for a draw),
+        the result for the entrants ('a', 'b' or 'draw'), the number of moves, the seconds taken by each move,
+        the mean seconds per move of A and B, and the per-move stats records if collect_stats is set.
+
+    """
+    sides = (0, 1) if game % 2 == 0 else (1, 0)     # entrant index of player 1 and player 2
+    modules = [importlib.import_module(name) for name in entrants]
+    for module in modules:
+        if hasattr(module, 'new_game'):
+            module.new_game()
+    random.seed(seed)
+
+    board = p2_t3.Board()
+    state = board.starting_state()
+    move_times = []
+    side_times = [[], []]
+    records = []
+    with contextlib.redirect_stdout(io.StringIO()):     # keep the bots' own printing out of the results
+        while not board.is_ended(state):
+            player = board.current_player(state)
+            side = sides[player - 1]
+            module = modules[side]
+            for name, value in settings[side].items():
+                setattr(module, name, value)
+
+            start = time()
+            if collect_stats and hasattr(module, 'search'):
+                action, stats = module.think(board, state, return_stats=True)
+                records.append(dict(game=game, ply=len(move_times), player=player, bot=entrants[side],
+                                    action=str(action), **stats.as_dict()))
+            else:
+                action = module.think(board, state)
+            elapsed = time() - start
+
+            move_times.append(elapsed)
+            side_times[side].append(elapsed)
+            state = board.next_state(state, action)
+
+    points = board.points_values(state)
+    winner = 1 if points[1] == 1 else 2 if points[2] == 1 else 0
+    result = {
+        'game': game,
+        'seed': seed,
+        'player1': entrants[sides[0]],
+        'player2': entrants[sides[1]],
+        'a_player': sides.index(0) + 1,
+        'winner': winner,
+        'result': 'draw' if winner == 0 else 'ab'[sides[winner - 1]],
+        'moves': len(move_times),
+        'time_per_move': [sum(times) / len(times) if times else 0. for times in side_times],
+        'move_times': move_times,
+    }
+    if collect_stats:
+        result['stats'] = records
+    return result
+
+
+def run_tournament(entrants, rounds: int, seed: int = 0, workers: int = 1, settings=({}, {}),
+                   collect_stats: bool = False):
+    """ Plays rounds games between two bots and yields each game's result as soon as it finishes.
+
+    Args:
+        entrants:   The module names of bots A and B.
+        rounds:     The number of games.
+        seed:       The tournament seed.
+        workers:    The number of processes to play games in; 1 plays them in this process, in order.
+        settings:   Two dicts of module attributes for A and B, see play_game.
+        collect_stats:  Whether each result should carry per-move search statistics.
+
+    Yields:
+        play_game results, in the order the games finish. Closing the generator early cancels the games that
+        have not started.
+
+    """
+    jobs = [(game, game_seed(seed, game), tuple(entrants), settings, collect_stats) for game in range(rounds)]
+    if workers <= 1:
+        for job in jobs:
+            yield play_game(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_game, *job) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def in_order(results):
+    """ Re-yields results from run_tournament in game order, holding back games that finished early.
+
+    Decisions taken game by game (such as stopping an SPRT) then see the same sequence whatever the number
+    of workers. Closing this generator closes the tournament too.
+    """
+    pending = {}
+    next_game = 0
+    try:
+        for result in results:
+            pending[result['game']] = result
+            while next_game in pending:
+                yield pending.pop(next_game)
+                next_game += 1
+    finally:
+        results.close()
+
+
+def score(result):
+    """ Returns entrant A's score in a game: 1 for a win, 0.5 for a draw, 0 for a loss. """
+    return {'a': 1, 'draw': 0.5, 'b': 0}[result['result']]
+
+
+def summarize(results):
+    """ Returns win, loss and draw counts for A and B overall and by colour, from a list of results. """
+    summary = {'games': len(results), 'a': 0, 'b': 0, 'draw': 0, 'player1': 0, 'player2': 0, 'moves': 0}
+    for result in results:
+        summary[result['result']] += 1
+        if result['winner']:
+            summary['player%d' % result['winner']] += 1
+        summary['moves'] += result['moves']
+    summary['mean_moves'] = summary.pop('moves') / len(results) if results else 0.
+    return summary
+
+
+def write_jsonl(f, result):
+    """ Writes one result as a JSON line and flushes, so the file can be followed while games run. """
+    f.write(json.dumps(result) + '\n')
+    f.flush()
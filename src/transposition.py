@@ -0,0 +1,107 @@
+""" A bounded transposition table and an MCTS iteration (dag_iteration) that uses it to share nodes between
+move orders.
+
+With the table, the search graph becomes a DAG: when an expansion reaches a position that is already in the
+table (the same cells filled in a different order), the existing node is linked in as the child instead of
+creating a new one, so both paths share its statistics. Because a node can then have several parents,
+backpropagation follows the path actually taken rather than parent links.
+"""
+from collections import OrderedDict
+from math import log, sqrt
+from random import choice
+from mcts_node import MCTSNode
+
+
+class TranspositionTable(object):
+    """ Zobrist hash -> MCTSNode, evicting the least recently used entry beyond capacity. """
+
+    def __init__(self, capacity: int = 200000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        self.lookups += 1
+        node = self.entries.get(key)
+        if node is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return node
+
+    def put(self, key, node):
+        self.entries[key] = node
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """ Drops all entries but keeps the hit counters, so hit_rate covers a whole game. """
+        self.entries.clear()
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.
+
+
+def ucb(node: MCTSNode, is_opponent: bool, log_parent_visits: float, explore_faction: float):
+    exploit = node.wins / node.visits
+    if is_opponent:
+        exploit = 1 - exploit
+    return exploit + explore_faction * sqrt(log_parent_visits / node.visits)
+
+
+def dag_iteration(board, root_node: MCTSNode, current_state, root_key, bot_identity: int, evaluate,
+                  table: TranspositionTable, explore_faction: float):
+    """ Runs one MCTS iteration from root_node, merging transpositions through table.
+
+    Args:
+        board:              The game setup.
+        root_node:          The root of the search, already stored in table under root_key.
+        current_state:      The state associated with root_node.
+        root_key:           The Zobrist hash of current_state.
+        bot_identity:       The bot's identity, either 1 or 2
+        evaluate:           Function of a state returning whether the bot won a playout from it.
+        table:              The transposition table to share nodes through.
+        explore_faction:    The UCB exploration constant.
+
+    Returns:
+        depth: The number of plies from the root to the evaluated node.
+        created: Whether a new node was added to the graph.
+
+    """
+    node, state, key = root_node, current_state, root_key
+    path = [node]
+    created = False
+
+    # Selection: descend through fully expanded nodes, scoring moves from the mover's point of view
+    while not board.is_ended(state) and len(node.child_nodes) == len(node.untried_actions):
+        is_opponent = board.current_player(state) != bot_identity
+        log_visits = log(node.visits)
+        action, node = max(node.child_nodes.items(),
+                           key=lambda item: ucb(item[1], is_opponent, log_visits, explore_faction))
+        state, key = board.next_state_hashed(state, key, action)
+        path.append(node)
+
+    # Expansion: link in the table's node for the new position, or create it
+    if not board.is_ended(state):
+        action = choice([a for a in node.untried_actions if a not in node.child_nodes])
+        state, key = board.next_state_hashed(state, key, action)
+        child = table.get(key)
+        if child is None:
+            child = MCTSNode(parent=node, parent_action=action, action_list=board.legal_actions(state))
+            table.put(key, child)
+            created = True
+        node.child_nodes[action] = child
+        path.append(child)
+
+    # Simulation and backpropagation along the path taken
+    won = evaluate(state)
+    for node in path:
+        node.visits += 1
+        if won:
+            node.wins += 1
+
+    return len(path) - 1, created
@@ -0,0 +1,277 @@
+""" Tree-parallel MCTS: several worker processes grow one search tree held in shared memory.
+
+The tree is a set of flat arrays in a single multiprocessing.shared_memory block, indexed by node number:
+visits, wins, parent, first_child, num_children and the packed action (9 * (3 * R + C) + (3 * r + c)) that
+leads into the node. The children of a node are allocated as one contiguous block under a lock; everything
+else is updated without locking, so concurrent updates can occasionally be lost, which MCTS tolerates.
+
+While a worker walks down the tree it adds a virtual loss to every node on its path (a visit without a
+win), which makes other workers prefer different paths until the real result is backed up.
+
+Wins are stored from the point of view of the player who made the move into the node.
+
+Usage: python tree_parallel.py [iterations] [max_workers]   prints nodes/sec for 1..max_workers workers.
+"""
+import atexit
+import multiprocessing
+import random
+import sys
+from math import log, sqrt
+from multiprocessing import shared_memory
+from timeit import default_timer as time
+from mcts_node import MCTSNode
+from p2_t3 import Board
+
+UNEXPANDED = -1
+
+# Packed action index -> action tuple.
+_actions = [(a // 27, (a // 9) % 3, (a % 9) // 3, a % 3) for a in range(81)]
+
+
+class SharedTree(object):
+    """ Flat node arrays living in one shared memory block.
+
+    Header slot 0 holds the number of allocated nodes.
+    """
+    _layout = (('visits', 'q', 8), ('wins', 'd', 8), ('parent', 'i', 4),
+               ('first_child', 'i', 4), ('num_children', 'i', 4), ('action', 'b', 1))
+
+    def __init__(self, capacity: int, name: str|None = None):
+        self.capacity = capacity
+        size = 8 * 8 + sum(width for _, _, width in self._layout) * capacity + 8 * len(self._layout)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        buf = self.shm.buf
+        self.header = buf[:64].cast('q')
+        offset = 64
+        for field, code, width in self._layout:
+            setattr(self, field, buf[offset:offset + width * capacity].cast(code))
+            offset += (width * capacity + 7) // 8 * 8
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def reset(self):
+        """ Empties the tree, leaving only an unexpanded root. """
+        self.header[0] = 1
+        self.visits[0] = 0
+        self.wins[0] = 0
+        self.parent[0] = -1
+        self.first_child[0] = UNEXPANDED
+        self.num_children[0] = 0
+        self.action[0] = -1
+
+    def size(self):
+        return self.header[0]
+
+    def close(self, unlink=False):
+        for field in ('header',) + tuple(field for field, _, _ in self._layout):
+            getattr(self, field).release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# State of a worker process, set up once by _init_worker.
+_tree = None
+_lock = None
+
+
+def _init_worker(name, capacity, lock):
+    global _tree, _lock
+    _tree = SharedTree(capacity, name)
+    _lock = lock
+
+
+def _expand(tree, lock, node, actions):
+    """ Allocates the children of node, unless another worker already did or the tree is full. """
+    with lock:
+        if tree.first_child[node] != UNEXPANDED:
+            return
+        base = tree.header[0]
+        if base + len(actions) > tree.capacity:
+            return
+        for offset, (R, C, r, c) in enumerate(actions):
+            child = base + offset
+            tree.visits[child] = 0
+            tree.wins[child] = 0
+            tree.parent[child] = node
+            tree.first_child[child] = UNEXPANDED
+            tree.num_children[child] = 0
+            tree.action[child] = 9 * (3 * R + C) + 3 * r + c
+        tree.header[0] = base + len(actions)
+        tree.num_children[node] = len(actions)
+        # Publish the block last, so readers never see a half-written set of children.
+        tree.first_child[node] = base
+
+
+def _iterate(tree, lock, board, root_state, explore_faction, virtual_loss):
+    """ Runs one selection / expansion / rollout / backpropagation pass. Returns the depth reached. """
+    visits, wins, first_child, num_children = tree.visits, tree.wins, tree.first_child, tree.num_children
+
+    node, state = 0, root_state
+    path = [0]
+    movers = [board.previous_player(state)]
+    visits[0] += virtual_loss
+
+    while not board.is_ended(state):
+        if first_child[node] == UNEXPANDED:
+            _expand(tree, lock, node, board.legal_actions(state))
+            if first_child[node] == UNEXPANDED:
+                break   # the tree is full, evaluate this node as a leaf
+
+        first, count = first_child[node], num_children[node]
+        log_visits = log(max(visits[node], 1))
+        best, best_score = first, -1.
+        for child in range(first, first + count):
+            child_visits = visits[child]
+            if child_visits == 0:
+                best = child
+                break
+            score = wins[child] / child_visits + explore_faction * sqrt(log_visits / child_visits)
+            if score > best_score:
+                best, best_score = child, score
+
+        fresh = visits[best] == 0
+        visits[best] += virtual_loss
+        movers.append(board.current_player(state))
+        state = board.next_state(state, _actions[tree.action[best]])
+        node = best
+        path.append(node)
+        if fresh:
+            break
+
+    winner = board.random_playout(state)
+    for node, mover in zip(path, movers):
+        visits[node] += 1 - virtual_loss
+        if winner == mover:
+            wins[node] += 1
+        elif winner == 0:
+            wins[node] += 0.5
+    return len(path) - 1
+
+
+def _worker_search(board, root_state, iterations, explore_faction, virtual_loss, seed):
+    random.seed(seed)
+    start = time()
+    max_depth = 0
+    for _ in range(iterations):
+        max_depth = max(max_depth, _iterate(_tree, _lock, board, root_state, explore_faction, virtual_loss))
+    return iterations, time() - start, max_depth
+
+
+class TreeParallelSearch(object):
+    """ A shared tree plus a persistent pool of workers attached to it. """
+
+    def __init__(self, workers: int, capacity: int = 500000):
+        self.workers = workers
+        self.tree = SharedTree(capacity)
+        self.lock = multiprocessing.Lock()
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                         initargs=(self.tree.name, capacity, self.lock))
+
+    def search(self, board, state, iterations: int, explore_faction: float = 2., virtual_loss: int = 1):
+        """ Grows the shared tree from state with iterations split across the workers.
+
+        Returns:
+            A dict of search statistics: iterations, elapsed seconds, nodes_per_sec, tree_size, max_depth.
+
+        """
+        self.tree.reset()
+        shares = [iterations // self.workers + (i < iterations % self.workers) for i in range(self.workers)]
+        jobs = [(board, state, share, explore_faction, virtual_loss, random.getrandbits(64)) for share in shares]
+
+        start = time()
+        results = self.pool.starmap(_worker_search, jobs)
+        elapsed = time() - start
+
+        done = sum(result[0] for result in results)
+        return {
+            'workers': self.workers,
+            'iterations': done,
+            'elapsed': elapsed,
+            'nodes_per_sec': done / elapsed if elapsed else 0.,
+            'tree_size': self.tree.size(),
+            'max_depth': max(result[2] for result in results),
+        }
+
+    def root_node(self, board, state):
+        """ Copies the root and its children into MCTSNodes, so callers can use get_best_action. """
+        tree = self.tree
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
+        root_node.visits = tree.visits[0]
+        first = tree.first_child[0]
+        if first != UNEXPANDED:
+            for child in range(first, first + tree.num_children[0]):
+                action = _actions[tree.action[child]]
+                node = MCTSNode(parent=root_node, parent_action=action, action_list=[])
+                node.visits = tree.visits[child]
+                node.wins = tree.wins[child]
+                root_node.child_nodes[action] = node
+        return root_node
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.tree.close(unlink=True)
+
+
+_searcher = None
+
+
+def get_searcher(workers: int):
+    """ Returns the shared TreeParallelSearch, (re)creating it only when the worker count changes. """
+    global _searcher
+    if _searcher is None or _searcher.workers != workers:
+        shutdown()
+        _searcher = TreeParallelSearch(workers)
+    return _searcher
+
+
+def shutdown():
+    global _searcher
+    if _searcher is not None:
+        _searcher.close()
+        _searcher = None
+
+atexit.register(shutdown)
+
+
+def tree_parallel_search(board, state, workers: int, iterations: int, explore_faction: float = 2.):
+    """ Searches state on the shared tree.
+
+    Returns:
+        root_node: The root and its children copied into MCTSNodes.
+        report: The statistics dict returned by TreeParallelSearch.search.
+
+    """
+    searcher = get_searcher(workers)
+    report = searcher.search(board, state, iterations, explore_faction)
+    return searcher.root_node(board, state), report
+
+
+def scaling_report(board, state, iterations: int, worker_counts):
+    """ Searches state once per worker count and returns the statistics of each run. """
+    reports = []
+    for workers in worker_counts:
+        searcher = TreeParallelSearch(workers)
+        try:
+            reports.append(searcher.search(board, state, iterations))
+        finally:
+            searcher.close()
+    return reports
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+
+    board = Board()
+    for report in scaling_report(board, board.starting_state(), iterations, range(1, max_workers + 1)):
+        print("workers %(workers)2d  %(nodes_per_sec)8.0f nodes/sec  "
+              "(%(nodes_per_sec_per_worker)6.0f per worker)  tree size %(tree_size)d  max depth %(max_depth)d"
+              % dict(report, nodes_per_sec_per_worker=report['nodes_per_sec'] / report['workers']))